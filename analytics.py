@@ -5,7 +5,10 @@ import asyncio
 import signal
 from main import fetch_data, core_loop, write_to_firebase, executor, shutdown_event
 from utils.logger import setup_logger
-from database_management.sqlite_db import get_total_impressions_and_views
+from database_management.sqlite_db import get_total_impressions_and_views, get_video_stats, get_video_stats_history
+from cache_management.cache_utils import get_cache_stats
+from database_management.db_utils import get_pool_stats
+from data_ingestion.nlp_engine import get_engine
 from firebase_admin import app_check
 
 logger = setup_logger()
@@ -43,7 +46,7 @@ def force_fetch():
     asyncio.set_event_loop(loop)
     try:
         logger.info("Force fetch initiated.")
-        loop.run_until_complete(fetch_data())
+        loop.run_until_complete(fetch_data(full_resync=True))
         loop.run_until_complete(core_loop())
         logger.info("Force fetch and training completed successfully.")
         return jsonify({"message": "Force fetch and training initiated."})
@@ -85,5 +88,31 @@ def video_stats():
         logger.error(f"Error fetching video stats: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/video_stats/<video_id>')
+def single_video_stats(video_id):
+    try:
+        stats = get_video_stats(video_id)
+        if stats is None:
+            return jsonify({"error": "Unknown video"}), 404
+        since = request.args.get('since', type=float)
+        history = [
+            {"bucket_start": bucket_start, "impressions": impressions, "views": views}
+            for bucket_start, impressions, views in get_video_stats_history(video_id, since)
+        ]
+        return jsonify({"impressions": stats[0], "views": stats[1], "history": history})
+    except Exception as e:
+        logger.error(f"Error fetching stats for video {video_id}: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(get_cache_stats())
+
+@app.route('/db_stats')
+def db_stats():
+    return jsonify(get_pool_stats())
+
 if __name__ == "__main__":
+    # Fork the NLP workers before any background threads start.
+    get_engine().start()
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""Recall and latency of the IVF index against exact search.
+
+Run from the repository root:
+
+    python -m benchmarks.ann_benchmark --sizes 10000 100000 --probes 4 8 16
+"""
+import argparse
+import time
+import numpy as np
+from model_serving.ann_index import IVFIndex
+from utils.config import EMBEDDING_DIMENSION
+
+def synthetic_embeddings(n_videos, dim, n_clusters=64, seed=0):
+    """Clustered vectors, roughly the shape of trained video embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n_videos)
+    noise = rng.normal(scale=0.5, size=(n_videos, dim)).astype(np.float32)
+    return centers[labels] + noise
+
+def exact_top_k(embeddings, query, k):
+    scores = embeddings @ query
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+def percentiles(latencies):
+    latencies_ms = np.array(latencies) * 1000.0
+    return np.percentile(latencies_ms, 50), np.percentile(latencies_ms, 99)
+
+def run(sizes, probes, k, n_queries, dim):
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        embeddings = synthetic_embeddings(size, dim)
+        queries = embeddings[rng.choice(size, n_queries, replace=False)] + rng.normal(scale=0.1, size=(n_queries, dim)).astype(np.float32)
+
+        exact_results, exact_latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            exact_results.append(set(exact_top_k(embeddings, query, k)))
+            exact_latencies.append(time.perf_counter() - start)
+        p50, p99 = percentiles(exact_latencies)
+        print(f"n={size:>9}  exact           recall@{k}=1.000  p50={p50:7.3f}ms  p99={p99:7.3f}ms")
+
+        start = time.perf_counter()
+        index = IVFIndex(embeddings)
+        build_seconds = time.perf_counter() - start
+
+        for n_probe in probes:
+            hits, latencies = 0, []
+            for query, expected in zip(queries, exact_results):
+                start = time.perf_counter()
+                rows = index.search(query, k, n_probe=n_probe)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected.intersection(rows.tolist()))
+            p50, p99 = percentiles(latencies)
+            recall = hits / (k * n_queries)
+            print(f"n={size:>9}  ivf nprobe={n_probe:<4} recall@{k}={recall:.3f}  p50={p50:7.3f}ms  p99={p99:7.3f}ms  "
+                  f"(lists={index.n_lists}, build={build_seconds:.2f}s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--probes', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIMENSION)
+    args = parser.parse_args()
+    run(args.sizes, args.probes, args.k, args.queries, args.dim)
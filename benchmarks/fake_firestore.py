@@ -0,0 +1,171 @@
+"""In-memory stand-in for the parts of the Firestore client the engine uses.
+
+Every document returned by a stream or get counts as one billed read in ``reads``
+and every document written counts once in ``writes``. An optional per-call
+``latency`` (seconds) simulates the network round-trip.
+"""
+import operator
+import threading
+import time
+
+_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq}
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class FakeDocument:
+    def __init__(self, client, parent, doc_id):
+        self._client = client
+        self.parent = parent
+        self.id = doc_id
+        self.path = f"{parent.path}/{doc_id}"
+
+    def collection(self, name):
+        return FakeCollection(self._client, name, parent=self)
+
+    def get(self):
+        self._client._count_reads(1)
+        return FakeSnapshot(self, self._client._docs.get(self.path))
+
+    def set(self, data, merge=False):
+        self._client._round_trip()
+        self._client._write(self.path, self._merged(data) if merge else dict(data))
+
+    def update(self, data):
+        self._client._round_trip()
+        if self._client._docs.get(self.path) is None:
+            raise KeyError(f"No document to update: {self.path}")
+        self._client._write(self.path, self._merged(data))
+
+    def _merged(self, data):
+        merged = dict(self._client._docs.get(self.path) or {})
+        merged.update(data)
+        return merged
+
+class FakeQuery:
+    def __init__(self, client, collection_path=None, group=None, filters=()):
+        self._client = client
+        self._collection_path = collection_path
+        self._group = group
+        self._filters = filters
+
+    def where(self, field, op, value):
+        return FakeQuery(self._client, self._collection_path, self._group, self._filters + ((field, op, value),))
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            if field not in data or not _OPERATORS[op](data[field], value):
+                return False
+        return True
+
+    def stream(self):
+        results = []
+        for path, data in list(self._client._docs.items()):
+            parent_path, _, doc_id = path.rpartition('/')
+            if self._collection_path is not None and parent_path != self._collection_path:
+                continue
+            if self._group is not None and parent_path.rpartition('/')[2] != self._group:
+                continue
+            if not self._matches(data):
+                continue
+            results.append(FakeSnapshot(self._client._reference(path), data))
+        self._client._count_reads(len(results))
+        return iter(results)
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, name, parent=None):
+        self.id = name
+        self.parent = parent
+        self.path = f"{parent.path}/{name}" if parent is not None else name
+        super().__init__(client, collection_path=self.path)
+
+    def document(self, doc_id):
+        return FakeDocument(self._client, self, doc_id)
+
+class FakeWriteBatch:
+    """Buffers writes and applies them in one round-trip on commit()."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference, dict(data), merge))
+
+    def update(self, reference, data):
+        if self._client._docs.get(reference.path) is None:
+            raise KeyError(f"No document to update: {reference.path}")
+        self._writes.append((reference, dict(data), True))
+
+    def commit(self):
+        self._client._round_trip()
+        for reference, data, merge in self._writes:
+            self._client._write(reference.path, reference._merged(data) if merge else data)
+        self._writes = []
+
+class FakeFirestore:
+    """Document store keyed by slash-separated path, e.g. ``videos/v1/comments/c1``."""
+
+    def __init__(self, latency=0.0):
+        self._docs = {}
+        self._lock = threading.Lock()
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
+
+    def _count_reads(self, n):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.reads += n
+            self.round_trips += 1
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.round_trips += 1
+
+    def _write(self, path, data):
+        with self._lock:
+            self._docs[path] = data
+            self.writes += 1
+
+    def _reference(self, path):
+        parts = path.split('/')
+        ref = FakeCollection(self, parts[0])
+        for index in range(1, len(parts)):
+            ref = ref.document(parts[index]) if index % 2 else ref.collection(parts[index])
+        return ref
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def collection_group(self, name):
+        return FakeQuery(self, group=name)
+
+    def get_all(self, references):
+        """Fetch several documents in one round-trip, yielding a snapshot per reference."""
+        references = list(references)
+        self._count_reads(len(references))
+        return iter([FakeSnapshot(ref, self._docs.get(ref.path)) for ref in references])
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def add(self, path, data):
+        """Seed a document without counting it as a write."""
+        self._docs[path] = dict(data)
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
@@ -0,0 +1,57 @@
+"""Firestore reads for the legacy nested fetch versus the single-pass catalog fetch.
+
+Run from the repository root:
+
+    python -m benchmarks.fetch_reads_benchmark --users 50 --videos 200 --comments 5 --latency-ms 2
+"""
+import argparse
+import time
+from benchmarks.fake_firestore import FakeFirestore
+from data_ingestion.catalog import user_payload, fetch_video_catalog, join_users_with_catalog
+
+def seed(db, n_users, n_videos, n_comments):
+    for u in range(n_users):
+        db.add(f"users/u{u}", {"tags": ["music"], "watchedViews": [f"v{u % n_videos}X"]})
+    for v in range(n_videos):
+        db.add(f"videos/v{v}", {"tags": ["music"], "description": f"video {v}", "views": v, "impressions": v + 1, "likes": [], "comcount": n_comments})
+        for c in range(n_comments):
+            db.add(f"videos/v{v}/comments/c{c}", {"content": f"comment {c}", "likes": 0, "dislikes": 0, "user": "u0"})
+
+def legacy_fetch(db):
+    """The original users x videos x comments nested stream."""
+    users_ref = db.collection('users')
+    videos_ref = db.collection('videos')
+    data = []
+    for user in users_ref.stream():
+        for video in videos_ref.stream():
+            comments = [comment.to_dict() for comment in videos_ref.document(video.id).collection('comments').stream()]
+            data.append((user.id, video.id, len(comments)))
+    return data
+
+def single_pass_fetch(db, comment_workers):
+    users = {user.id: user_payload(user.to_dict()) for user in db.collection('users').stream()}
+    videos, _, _ = fetch_video_catalog(db.collection('videos'), comment_workers=comment_workers)
+    return join_users_with_catalog(users, videos, users, videos)
+
+def measure(label, db, fn, *args):
+    db.reset_counters()
+    start = time.perf_counter()
+    records = fn(db, *args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} records={len(records):>8}  reads={db.reads:>10}  round_trips={db.round_trips:>7}  time={elapsed:8.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--videos', type=int, default=200)
+    parser.add_argument('--comments', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=1.0)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    db = FakeFirestore(latency=args.latency_ms / 1000.0)
+    seed(db, args.users, args.videos, args.comments)
+
+    measure("legacy nested", db, legacy_fetch)
+    measure("single pass", db, single_pass_fetch, 1)
+    measure(f"single pass, {args.workers} workers", db, single_pass_fetch, args.workers)
@@ -0,0 +1,63 @@
+"""Time and memory of the sparse interaction builder versus the legacy dense fill.
+
+Run from the repository root:
+
+    python -m benchmarks.interaction_matrix_benchmark --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from model_training.interactions import build_interaction_matrix
+
+def synthetic_records(n_records, seed=0):
+    """Interactions over a long-tailed catalog, roughly 20 per user."""
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_records // 20)
+    n_videos = max(1, n_records // 10)
+    users = rng.integers(0, n_users, size=n_records)
+    videos = np.minimum(rng.zipf(1.3, size=n_records) - 1, n_videos - 1)
+    views = rng.integers(0, 10000, size=n_records)
+    return [
+        {"user_id": f"u{u}", "video_id": f"v{v}", "views": int(n)}
+        for u, v, n in zip(users, videos, views)
+    ]
+
+def legacy_dense(data):
+    """The original train_model fill: dense, sized by record count, list.index lookups."""
+    user_ids = [record["user_id"] for record in data]
+    video_ids = [record["video_id"] for record in data]
+    interaction_matrix = np.zeros((len(user_ids), len(video_ids)))
+    for record in data:
+        user_idx = user_ids.index(record["user_id"])
+        video_idx = video_ids.index(record["video_id"])
+        interaction_matrix[user_idx, video_idx] = record["views"]
+    return interaction_matrix
+
+def measure(fn, data):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--legacy-max', type=int, default=5000,
+                        help="largest size to run the dense fill for; above it only its allocation is estimated")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        data = synthetic_records(size)
+        (matrix, _, _), elapsed, peak = measure(build_interaction_matrix, data)
+        print(f"n={size:>8}  sparse  shape={matrix.shape}  nnz={matrix.nnz:>8}  time={elapsed:8.3f}s  peak={peak / 2**20:9.1f}MiB")
+
+        dense_bytes = size * size * 8
+        if size <= args.legacy_max:
+            _, elapsed, peak = measure(legacy_dense, data)
+            print(f"n={size:>8}  dense                               time={elapsed:8.3f}s  peak={peak / 2**20:9.1f}MiB")
+        else:
+            print(f"n={size:>8}  dense   skipped; would allocate {dense_bytes / 2**30:,.1f}GiB and scan up to {size * size:,} list entries")
@@ -0,0 +1,73 @@
+"""Rows/s for the legacy per-row insert versus the bulk WAL upsert.
+
+Run from the repository root:
+
+    python -m benchmarks.sqlite_ingest_benchmark --rows 100000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from database_management.db_utils import DATA_TABLE_SCHEMA, STATS_SCHEMA, configure_connection, upsert_records, record_params
+
+LEGACY_SCHEMA = '''
+CREATE TABLE data (
+    user_id TEXT, video_id TEXT, interests TEXT, tags TEXT, description TEXT,
+    retention REAL, likes INTEGER, comments INTEGER, correlate REAL
+)
+'''
+
+def synthetic_records(n_rows):
+    return [
+        {
+            "user_id": f"u{i // 50}",
+            "video_id": f"v{i % 5000}",
+            "interests": ["music", "gaming"],
+            "tags": ["music"],
+            "description": ["great", "video", str(i)],
+            "retention": 42.0,
+            "likes": ["a", "b"],
+            "comments_count": 3,
+            "impressions": 100 + i,
+            "views": 10 + i,
+        }
+        for i in range(n_rows)
+    ]
+
+def legacy_insert(path, records):
+    """The original path: default rollback journal, one execute and commit per row."""
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    query = "INSERT OR REPLACE INTO data VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    for record in records:
+        conn.execute(query, record_params(record)[:9])
+        conn.commit()
+    conn.close()
+
+def bulk_insert(path, records):
+    conn = sqlite3.connect(path)
+    configure_connection(conn)
+    conn.execute(DATA_TABLE_SCHEMA)
+    conn.executescript(STATS_SCHEMA)
+    upsert_records(conn, records)
+    conn.close()
+
+def measure(label, fn, records):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        start = time.perf_counter()
+        fn(path, records)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<8} rows={len(records):>8}  time={elapsed:8.2f}s  rows/s={len(records) / elapsed:>10,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--legacy-rows', type=int, default=10000,
+                        help="rows for the legacy path, which fsyncs on every row")
+    args = parser.parse_args()
+
+    records = synthetic_records(args.rows)
+    measure("legacy", legacy_insert, records[:args.legacy_rows])
+    measure("bulk", bulk_insert, records)
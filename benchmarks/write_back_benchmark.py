@@ -0,0 +1,55 @@
+"""Firestore round-trips for the legacy per-record write-back versus the batched stage.
+
+Run from the repository root:
+
+    python -m benchmarks.write_back_benchmark --users 500 --records-per-user 20 --latency-ms 2
+"""
+import argparse
+import time
+from benchmarks.fake_firestore import FakeFirestore
+from model_serving.write_back import write_back
+
+def seed(db, n_users):
+    for u in range(n_users):
+        db.add(f"UserData/u{u}", {"watchedViews": [f"v{u % 7}X"]})
+        db.add(f"UserData/u{u}/algs/discover", {"vid": [f"v{i}" for i in range(10)]})
+
+def fake_recommend(user_ids, watched=None):
+    return [[f"v{(hash(user_id) + i) % 100}" for i in range(10)] for user_id in user_ids]
+
+def legacy_write_back(db, records):
+    """The original loop: two gets and an update per record, one after another."""
+    user_ids = list(dict.fromkeys(record["user_id"] for record in records))
+    recommendations = dict(zip(user_ids, fake_recommend(user_ids)))
+    for record in records:
+        user_ref = db.collection('UserData').document(record["user_id"])
+        watched_views = user_ref.get().to_dict().get('watchedViews', [])
+        algs_ref = user_ref.collection('algs').document('discover')
+        current = algs_ref.get().to_dict().get('vid', [])
+        updated = [rec for rec in current if rec not in watched_views]
+        updated.extend(recommendations[record["user_id"]])
+        algs_ref.update({'vid': updated})
+    return len(records)
+
+def batched_write_back(db, records):
+    return write_back(db, [record["user_id"] for record in records], fake_recommend)
+
+def measure(label, fn, n_users, records, latency):
+    db = FakeFirestore(latency=latency)
+    seed(db, n_users)
+    start = time.perf_counter()
+    fn(db, records)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} reads={db.reads:>8}  writes={db.writes:>8}  round_trips={db.round_trips:>7}  time={elapsed:8.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--records-per-user', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    records = [{"user_id": f"u{u}"} for _ in range(args.records_per_user) for u in range(args.users)]
+    latency = args.latency_ms / 1000.0
+    measure("legacy", legacy_write_back, args.users, records, latency)
+    measure("batched", batched_write_back, args.users, records, latency)
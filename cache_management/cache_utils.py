@@ -1,6 +1,16 @@
 import redis
 import json
+import struct
 import logging
+import threading
+import time
+import uuid
+from cache_management.codecs import encode, decode
+from cache_management.local_cache import LocalCache
+from utils.config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT,
+    CACHE_CHUNK_SIZE, CACHE_EXPIRATION, LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL, CACHE_INVALIDATION_CHANNEL
+)
 
 logger = logging.getLogger("CacheUtils")
 logger.setLevel(logging.INFO)
@@ -9,41 +19,317 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+# One explicitly sized pool shared by every thread of the process. Callers that
+# exceed it block for up to REDIS_SOCKET_TIMEOUT instead of opening new sockets.
+connection_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_SOCKET_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+)
 
-def set_cache(key, value, expiration=3600):
-    """Set a value in the Redis cache with an optional expiration time."""
+redis_client = redis.Redis(connection_pool=connection_pool)
+
+# In-process tier in front of Redis. Writers publish the key they changed on
+# CACHE_INVALIDATION_CHANNEL and every other process drops its local copy.
+local_cache = LocalCache(LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_TTL)
+
+PROCESS_ID = uuid.uuid4().hex
+
+_stats_lock = threading.Lock()
+_redis_stats = {"hits": 0, "misses": 0}
+_invalidations_received = 0
+
+# Bumped whenever remote invalidations are applied. A read that saw it change while
+# it was talking to Redis may hold a value that was just invalidated, so it doesn't
+# fill the local tier.
+_invalidation_generation = 0
+
+_listener_lock = threading.Lock()
+_listener_thread = None
+
+def _bump_generation():
+    global _invalidation_generation
+    with _stats_lock:
+        _invalidation_generation += 1
+
+def _current_generation():
+    with _stats_lock:
+        return _invalidation_generation
+
+def _handle_invalidation(data):
+    global _invalidations_received
+    message = json.loads(data)
+    if message.get("origin") == PROCESS_ID:
+        return
+    _bump_generation()
+    keys = message.get("keys")
+    if keys is None:
+        local_cache.clear()
+    else:
+        for key in keys:
+            local_cache.invalidate(key)
+    with _stats_lock:
+        _invalidations_received += 1
+
+def _listen_for_invalidations():
+    # The subscription holds its connection for good, so it gets its own client
+    # rather than permanently taking a slot in the shared pool.
+    subscriber = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    while True:
+        try:
+            pubsub = subscriber.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                _handle_invalidation(message['data'])
+        except Exception as e:
+            logger.error(f"Cache invalidation listener error: {e}")
+            # Invalidations may have been missed while disconnected.
+            _bump_generation()
+            local_cache.clear()
+            time.sleep(1)
+
+def _ensure_invalidation_listener():
+    global _listener_thread
+    with _listener_lock:
+        if _listener_thread is None:
+            _listener_thread = threading.Thread(target=_listen_for_invalidations, name="CacheInvalidation")
+            _listener_thread.daemon = True
+            _listener_thread.start()
+
+def _publish_invalidation(pipe, keys):
+    pipe.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": PROCESS_ID, "keys": keys}))
+
+def get_cache_stats():
+    """Return hit/miss counters for the local and Redis tiers."""
+    with _stats_lock:
+        return {
+            "local": local_cache.stats(),
+            "redis": dict(_redis_stats),
+            "invalidations_received": _invalidations_received
+        }
+
+def _count_redis(outcome):
+    with _stats_lock:
+        _redis_stats[outcome] += 1
+
+# Values larger than CACHE_CHUNK_SIZE are stored as a manifest under the key plus
+# numbered chunk keys. Every bulk call costs one pipeline round-trip, plus one
+# more when chunked values have to be fetched.
+CHUNK_MANIFEST = b'C'
+
+def _chunk_key(key, index):
+    return f"{key}:chunk:{index}"
+
+def _chunk_count(manifest):
+    return struct.unpack('<I', manifest[1:5])[0]
+
+def _is_manifest(value):
+    return value is not None and value[:1] == CHUNK_MANIFEST
+
+def _queue_sets(pipe, mapping, expiration):
+    """Queue the SETEX commands for several values on a pipeline; returns the encoded size."""
+    total_bytes = 0
+    for key, value in mapping.items():
+        data = encode(value)
+        total_bytes += len(data)
+        if len(data) > CACHE_CHUNK_SIZE:
+            chunks = [data[i:i + CACHE_CHUNK_SIZE] for i in range(0, len(data), CACHE_CHUNK_SIZE)]
+            for index, chunk in enumerate(chunks):
+                pipe.setex(_chunk_key(key, index), expiration, chunk)
+            pipe.setex(key, expiration, CHUNK_MANIFEST + struct.pack('<I', len(chunks)))
+        else:
+            pipe.setex(key, expiration, data)
+    return total_bytes
+
+def set_many(mapping, expiration=CACHE_EXPIRATION):
+    """Set several values in one pipeline with a shared expiration time."""
     try:
-        redis_client.setex(key, expiration, json.dumps(value))
-        logger.info(f"Set cache for key: {key}")
+        pipe = redis_client.pipeline(transaction=False)
+        total_bytes = _queue_sets(pipe, mapping, expiration)
+        _publish_invalidation(pipe, list(mapping))
+        pipe.execute()
+        for key, value in mapping.items():
+            local_cache.set(key, value, expiration)
+        logger.info(f"Set cache for {len(mapping)} keys ({total_bytes} bytes)")
     except Exception as e:
-        logger.error(f"Error setting cache for key {key}: {e}")
+        logger.error(f"Error setting cache for keys {list(mapping)[:10]}: {e}")
 
-def get_cache(key):
-    """Get a value from the Redis cache."""
+def store_many(mapping, expiration=CACHE_EXPIRATION):
+    """Write several values straight to Redis in one pipeline, without the local tier or invalidations.
+
+    Only for keys that are never overwritten with a different value, such as
+    version-scoped keys, so no process can hold a stale local copy of them.
+    """
     try:
-        value = redis_client.get(key)
-        if value:
-            logger.info(f"Cache hit for key: {key}")
-            return json.loads(value)
-        logger.info(f"Cache miss for key: {key}")
-        return None
+        pipe = redis_client.pipeline(transaction=False)
+        total_bytes = _queue_sets(pipe, mapping, expiration)
+        pipe.execute()
+        logger.info(f"Stored {len(mapping)} keys ({total_bytes} bytes)")
     except Exception as e:
-        logger.error(f"Error getting cache for key {key}: {e}")
-        return None
+        logger.error(f"Error storing keys {list(mapping)[:10]}: {e}")
+
+def get_many(keys):
+    """Get several values, serving what it can locally and the rest in one pipeline.
+
+    Values fetched from Redis are kept locally no longer than their remaining Redis
+    TTL. Returns a dict containing only the keys that were found.
+    """
+    results = {}
+    try:
+        remote_keys = []
+        for key in keys:
+            hit, cached = local_cache.get(key)
+            if hit:
+                results[key] = cached
+            else:
+                remote_keys.append(key)
+        if not remote_keys:
+            return results
+
+        _ensure_invalidation_listener()
+        generation = _current_generation()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.mget(remote_keys)
+        for key in remote_keys:
+            pipe.pttl(key)
+        replies = pipe.execute()
+        values = dict(zip(remote_keys, replies[0]))
+        ttls = dict(zip(remote_keys, replies[1:]))
+
+        manifests = {key: _chunk_count(value) for key, value in values.items() if _is_manifest(value)}
+        if manifests:
+            pipe = redis_client.pipeline(transaction=False)
+            for key, count in manifests.items():
+                for index in range(count):
+                    pipe.get(_chunk_key(key, index))
+            chunks = iter(pipe.execute())
+            for key, count in manifests.items():
+                parts = [next(chunks) for _ in range(count)]
+                values[key] = None if any(part is None for part in parts) else b''.join(parts)
+
+        fill_local = _current_generation() == generation
+        for key, value in values.items():
+            if value:
+                decoded = decode(value)
+                if fill_local:
+                    # PTTL is -1 for keys without an expiry; those use the local default.
+                    local_cache.set(key, decoded, ttls[key] / 1000 if ttls[key] > 0 else None)
+                results[key] = decoded
+                _count_redis("hits")
+            else:
+                _count_redis("misses")
+    except Exception as e:
+        logger.error(f"Error getting cache for keys {list(keys)[:10]}: {e}")
+    return results
+
+def delete_many(keys):
+    """Delete several values, including the chunks of chunked values."""
+    keys = list(keys)
+    if not keys:
+        return
+    try:
+        to_delete = list(keys)
+        for key, value in zip(keys, redis_client.mget(keys)):
+            if _is_manifest(value):
+                to_delete.extend(_chunk_key(key, index) for index in range(_chunk_count(value)))
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.delete(*to_delete)
+        _publish_invalidation(pipe, keys)
+        pipe.execute()
+        for key in keys:
+            local_cache.invalidate(key)
+        logger.info(f"Deleted cache for {len(keys)} keys")
+    except Exception as e:
+        logger.error(f"Error deleting cache for keys {keys[:10]}: {e}")
+
+def set_cache(key, value, expiration=CACHE_EXPIRATION):
+    """Set a value in the Redis cache with an optional expiration time."""
+    set_many({key: value}, expiration)
+
+def get_cache(key):
+    """Get a value from the Redis cache."""
+    value = get_many([key]).get(key)
+    logger.info(f"Cache {'hit' if value is not None else 'miss'} for key: {key}")
+    return value
 
 def delete_cache(key):
     """Delete a value from the Redis cache."""
+    delete_many([key])
+
+# Redis sets bypass the local tier: they are only used for membership checks
+# that must see every other process's additions immediately.
+def add_to_set(key, members, chunk_size=10000):
+    """Add members to a Redis set."""
+    members = list(members)
+    if not members:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for start in range(0, len(members), chunk_size):
+            pipe.sadd(key, *members[start:start + chunk_size])
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error adding {len(members)} members to set {key}: {e}")
+
+def set_membership(key, members, chunk_size=10000):
+    """Return one boolean per member saying whether it is in the Redis set."""
+    members = list(members)
+    found = []
+    for start in range(0, len(members), chunk_size):
+        found.extend(bool(flag) for flag in redis_client.smismember(key, members[start:start + chunk_size]))
+    return found
+
+def replace_hash(key, mapping, chunk_size=10000):
+    """Atomically replace a Redis hash: fill a staging key, then rename it over the live one."""
+    staging_key = f"{key}:staging"
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.delete(staging_key)
+        items = list(mapping.items())
+        for start in range(0, len(items), chunk_size):
+            pipe.hset(staging_key, mapping=dict(items[start:start + chunk_size]))
+        if items:
+            pipe.rename(staging_key, key)
+        else:
+            pipe.delete(key)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error replacing hash {key}: {e}")
+
+def update_hash(key, mapping, chunk_size=10000):
+    """Set fields of a Redis hash, leaving the others untouched."""
+    items = list(mapping.items())
+    if not items:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for start in range(0, len(items), chunk_size):
+            pipe.hset(key, mapping=dict(items[start:start + chunk_size]))
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error updating hash {key}: {e}")
+
+def hash_get_many(key, fields):
+    """Return one value (bytes, or None when missing) per field of a Redis hash."""
+    fields = list(fields)
+    if not fields:
+        return []
     try:
-        redis_client.delete(key)
-        logger.info(f"Deleted cache for key: {key}")
+        return redis_client.hmget(key, fields)
     except Exception as e:
-        logger.error(f"Error deleting cache for key {key}: {e}")
+        logger.error(f"Error reading hash {key}: {e}")
+        return [None] * len(fields)
 
 def clear_cache():
     """Clear all values from the Redis cache."""
     try:
         redis_client.flushdb()
+        redis_client.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": PROCESS_ID, "keys": None}))
+        local_cache.clear()
         logger.info("Cleared all cache")
     except Exception as e:
         logger.error(f"Error clearing cache: {e}")
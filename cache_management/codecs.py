@@ -0,0 +1,83 @@
+import json
+import struct
+import zlib
+from datetime import date, datetime
+import msgpack
+import numpy as np
+from utils.config import CACHE_CODEC, CACHE_COMPRESSION_THRESHOLD
+
+# Every encoded value starts with a one-byte codec tag and a one-byte flags field.
+FLAG_COMPRESSED = 0x01
+
+_NDARRAY_EXT = 1
+
+class JsonCodec:
+    tag = b'J'
+
+    def encode(self, value):
+        return json.dumps(value, default=str).encode('utf-8')
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+class MsgpackCodec:
+    """MessagePack with NumPy arrays stored as raw buffers (dtype, shape, bytes)."""
+    tag = b'M'
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, np.ndarray):
+            array = np.ascontiguousarray(obj)
+            header = msgpack.packb((array.dtype.str, array.shape))
+            return msgpack.ExtType(_NDARRAY_EXT, struct.pack('<I', len(header)) + header + array.tobytes())
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        raise TypeError(f"Cannot encode object of type {type(obj).__name__}")
+
+    @staticmethod
+    def _ext_hook(code, data):
+        if code == _NDARRAY_EXT:
+            (header_length,) = struct.unpack_from('<I', data)
+            dtype, shape = msgpack.unpackb(data[4:4 + header_length])
+            return np.frombuffer(data, dtype=np.dtype(dtype), offset=4 + header_length).reshape(shape)
+        return msgpack.ExtType(code, data)
+
+    def encode(self, value):
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def decode(self, payload):
+        return msgpack.unpackb(payload, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+
+_codecs = {}
+
+def register_codec(name, codec):
+    """Make a codec available by name for encoding and by tag for decoding."""
+    _codecs[name] = codec
+    _codecs[codec.tag] = codec
+
+register_codec('json', JsonCodec())
+register_codec('msgpack', MsgpackCodec())
+
+def encode(value, codec=CACHE_CODEC, compression_threshold=CACHE_COMPRESSION_THRESHOLD):
+    """Serialise a value with the named codec, zlib-compressing payloads above the threshold."""
+    codec = _codecs[codec]
+    payload = codec.encode(value)
+    flags = 0
+    if compression_threshold is not None and len(payload) >= compression_threshold:
+        compressed = zlib.compress(payload, 1)
+        if len(compressed) < len(payload):
+            payload = compressed
+            flags |= FLAG_COMPRESSED
+    return codec.tag + bytes([flags]) + payload
+
+def decode(data):
+    """Deserialise a value written by encode(); bare JSON from before the codec layer is still accepted."""
+    codec = _codecs.get(data[:1])
+    if codec is None or len(data) < 2:
+        return json.loads(data)
+    payload = data[2:]
+    if data[1] & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+    return codec.decode(payload)
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils.config import INGEST_UPDATED_FIELD, INGEST_COMMENT_DATE_FIELD
+
+EXCLUDED_VIDEO_TAG = '#2x10862CE'
+
+def changed_documents(ref, field, since):
+    """Stream every document of ref, or only those whose field is later than since."""
+    if since is None:
+        return ref.stream()
+    return ref.where(field, '>', since).stream()
+
+def advance_watermark(watermark, value):
+    """Return the later of the current watermark and a document's timestamp."""
+    if isinstance(value, datetime) and (watermark is None or value > watermark):
+        return value
+    return watermark
+
+def watched_video_ids(watched_views):
+    """Video ids from a user's watchedViews entries, which carry a trailing 'X'."""
+    return {view.rstrip('X') for view in watched_views}
+
+def user_payload(user_data):
+    return {
+        "interests": user_data.get('tags', []),
+        "watched_views": user_data.get('watchedViews', [])
+    }
+
+def video_payload(video_data, comments):
+    return {
+        "tags": video_data.get('tags', []),
+        "description": video_data.get('description', ''),
+        "views": video_data.get('views', 0),
+        "impressions": video_data.get('impressions', 0),
+        "likes": video_data.get('likes', []),
+        "comments_count": video_data.get('comcount', 0),
+        "comments": comments
+    }
+
+def comment_payload(comment_data):
+    return {
+        "content": comment_data.get('content', ''),
+        "date": comment_data.get('date', None),
+        "dislikes": comment_data.get('dislikes', 0),
+        "likes": comment_data.get('likes', 0),
+        "user": comment_data.get('user', '')
+    }
+
+def fetch_comments(videos_ref, video_id):
+    """Read a video's full comments subcollection, returning the comments and their latest date."""
+    comments = {}
+    latest = None
+    for comment in videos_ref.document(video_id).collection('comments').stream():
+        comment_data = comment.to_dict()
+        comments[comment.id] = comment_payload(comment_data)
+        latest = advance_watermark(latest, comment_data.get(INGEST_COMMENT_DATE_FIELD))
+    return comments, latest
+
+def fetch_video_catalog(videos_ref, since=None, known_videos=None, comment_workers=1):
+    """Read the (changed) video catalog once, with comments, into an in-memory snapshot.
+
+    Comments are only read for videos missing from known_videos; known videos keep their
+    mirrored comments. With comment_workers > 1 the comment subcollections are read
+    concurrently on a bounded thread pool.
+
+    Returns the snapshot as {video_id: payload} plus the latest video and comment timestamps seen.
+    """
+    known_videos = known_videos or {}
+    video_docs = [(video.id, video.to_dict()) for video in changed_documents(videos_ref, INGEST_UPDATED_FIELD, since)]
+
+    missing_ids = [video_id for video_id, _ in video_docs if video_id not in known_videos]
+    if comment_workers > 1 and len(missing_ids) > 1:
+        with ThreadPoolExecutor(max_workers=comment_workers) as pool:
+            fetched = dict(zip(missing_ids, pool.map(lambda video_id: fetch_comments(videos_ref, video_id), missing_ids)))
+    else:
+        fetched = {video_id: fetch_comments(videos_ref, video_id) for video_id in missing_ids}
+
+    snapshot = {}
+    videos_watermark = None
+    comments_watermark = None
+    for video_id, video_data in video_docs:
+        if video_id in fetched:
+            comments, latest_comment = fetched[video_id]
+            comments_watermark = advance_watermark(comments_watermark, latest_comment)
+        else:
+            comments = known_videos[video_id]["comments"]
+        snapshot[video_id] = video_payload(video_data, comments)
+        videos_watermark = advance_watermark(videos_watermark, video_data.get(INGEST_UPDATED_FIELD))
+
+    return snapshot, videos_watermark, comments_watermark
+
+def join_users_with_catalog(users, videos, changed_user_ids, changed_video_ids):
+    """Join users against the video snapshot, keeping only pairs where either side changed."""
+    data = []
+    for user_id, user in users.items():
+        video_ids = videos.keys() if user_id in changed_user_ids else changed_video_ids
+        for video_id in video_ids:
+            video = videos[video_id]
+            if EXCLUDED_VIDEO_TAG in video["tags"]:
+                continue
+
+            data.append({
+                "user_id": user_id,
+                "interests": user["interests"],
+                "watched_views": user["watched_views"],
+                "video_id": video_id,
+                "tags": video["tags"],
+                "description": video["description"],
+                "retention": 0,
+                "likes": video["likes"],
+                "comments_count": video["comments_count"],
+                "comments": list(video["comments"].values()),
+                "impressions": video["impressions"],
+                "views": video["views"]
+            })
+    return data
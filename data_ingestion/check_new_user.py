@@ -1,73 +1,129 @@
 import time
 import threading
-import random
 from firebase_admin import firestore
-from cache_management.cache_utils import get_cache, set_cache
-from model_serving.inference import recommend, fetch_user_and_video_ids, load_model
+from cache_management.cache_utils import get_cache, add_to_set, set_membership
+from model_serving.embedding_store import get_store_handle
+from model_serving.catalog_snapshot import CatalogSnapshot
+from model_serving.write_back import discover_ref, commit_documents
+from data_ingestion.ingest_state import load_user_ids
+from model_serving.fallback import fallback_recommendations
 from utils.logger import setup_logger
-from utils.config import MODEL_DIR
+from utils.config import NEW_USER_BATCH_WINDOW
 from firebase_init import db  
 
 logger = setup_logger()
 
-model = load_model(MODEL_DIR)
+KNOWN_USERS_KEY = 'known_user_ids'
 
-cache_lock = threading.Lock()
+# User ids reported by the UserData listener since the last batch, in arrival order.
+pending_lock = threading.Lock()
+pending_user_ids = {}
 
-def check_for_new_users():
-    try:
-        if model is None:
-            logger.warning("Model not loaded. Skipping new user check.")
-            return
+catalog_snapshot = None
 
-        users_ref = db.collection('UserData')
-        users = users_ref.stream()
+def current_catalog():
+    """The catalog snapshot kept by the background task, or None before it has started."""
+    return catalog_snapshot.current() if catalog_snapshot is not None else None
 
-        with cache_lock:
-            cached_user_ids = get_cache('user_ids') or []
+def on_user_snapshot(docs, changes, read_time):
+    """Queue ids of added UserData documents; the first snapshot reports every existing user."""
+    added = [change.document.id for change in changes if change.type.name == 'ADDED']
+    if added:
+        with pending_lock:
+            pending_user_ids.update(dict.fromkeys(added))
 
-        new_user_ids = []
+def _requeue(user_ids):
+    with pending_lock:
+        pending_user_ids.update(dict.fromkeys(user_ids))
 
-        for user in users:
-            user_id = user.id
-            if user_id not in cached_user_ids:
-                new_user_ids.append(user_id)
-                user_ref = db.collection('UserData').document(user_id)
-                algs_ref = user_ref.collection('algs').document('discover')
-                if not algs_ref.get().exists:
-                    algs_ref.set({'vid': []})
+def _seed_known_users():
+    """Mark users that were already ingested as known, so a flushed or new Redis doesn't reseed everyone.
 
-                _, video_ids = fetch_user_and_video_ids()
+    The SQLite ingest mirror is durable; the id list cached by earlier versions, which
+    polled instead of listening, is carried over too while it hasn't expired.
+    """
+    add_to_set(KNOWN_USERS_KEY, load_user_ids())
+    add_to_set(KNOWN_USERS_KEY, get_cache('user_ids') or [])
 
-                if video_ids:
-                    recommendations = recommend(user_id, model, video_ids, top_k=100)
+def check_for_new_users():
+    """Score every user queued since the last window in one batch and seed their discover lists."""
+    with pending_lock:
+        candidates = list(pending_user_ids)
+        pending_user_ids.clear()
+    if not candidates:
+        return
 
-                    if len(recommendations) < 100:
-                        remaining_slots = 100 - len(recommendations)
-                        random_videos = random.sample(video_ids, min(remaining_slots, len(video_ids)))
-                        recommendations.extend(random_videos)
+    try:
+        model = get_store_handle().get()
+        if model is None:
+            logger.warning("Model not loaded. Skipping new user check.")
+            _requeue(candidates)
+            return
 
-                    if len(recommendations) < 100:
-                        logger.warning(f"Could only find {len(recommendations)} videos for user {user_id}")
+        known = set_membership(KNOWN_USERS_KEY, candidates)
+        new_user_ids = [user_id for user_id, is_known in zip(candidates, known) if not is_known]
+        if not new_user_ids:
+            return
 
-                    algs_ref.update({
-                        'vid': firestore.ArrayUnion(recommendations)
-                    })
-                else:
-                    logger.warning(f"No videos found to recommend for user {user_id}")
+        catalog = catalog_snapshot.current()
+        video_ids = list(catalog.video_ids)
+        if not video_ids:
+            logger.warning(f"No videos found to recommend for {len(new_user_ids)} new users")
+            _requeue(new_user_ids)
+            return
 
-        with cache_lock:
-            cached_user_ids.extend(new_user_ids)
-            set_cache('user_ids', cached_user_ids)
+        # Users the model has never seen would only be scored against the OOV embedding,
+        # so they are served straight from the precomputed fallback lists.
+        # Without a checkpoint there is no vocabulary to check against, so everyone is scored.
+        trained_user_ids = model.trained_user_ids
+        cold_user_ids = [user_id for user_id in new_user_ids if trained_user_ids and user_id not in trained_user_ids]
+        warm_user_ids = [user_id for user_id in new_user_ids if not trained_user_ids or user_id in trained_user_ids]
+
+        recommendations_by_user = dict(zip(cold_user_ids, fallback_recommendations(cold_user_ids, top_k=100)))
+        if warm_user_ids:
+            recommendations_by_user.update(zip(
+                warm_user_ids, model.recommend_batch(warm_user_ids, video_ids, top_k=100, signature=catalog.signature)
+            ))
+
+        # Top up short model lists (small catalogs) from the fallback lists.
+        short_user_ids = [user_id for user_id in warm_user_ids if len(recommendations_by_user[user_id]) < 100]
+        paddings = fallback_recommendations(
+            short_user_ids, top_k=100, exclude_ids=[set(recommendations_by_user[user_id]) for user_id in short_user_ids]
+        )
+        for user_id, padding in zip(short_user_ids, paddings):
+            recommendations = recommendations_by_user[user_id]
+            recommendations_by_user[user_id] = recommendations + padding[:100 - len(recommendations)]
+
+        updates = []
+        for user_id in new_user_ids:
+            recommendations = recommendations_by_user[user_id]
+
+            if len(recommendations) < 100:
+                logger.warning(f"Could only find {len(recommendations)} videos for user {user_id}")
+
+            updates.append((discover_ref(db, user_id), {'vid': firestore.ArrayUnion(recommendations)}))
+
+        written = commit_documents(db, updates)
+        # Only users whose lists were written count as known; the rest get another try next window.
+        seeded = [user_id for user_id, ok in zip(new_user_ids, written) if ok]
+        add_to_set(KNOWN_USERS_KEY, seeded)
+        _requeue(user_id for user_id, ok in zip(new_user_ids, written) if not ok)
+        logger.info(f"Seeded recommendations for {len(seeded)} of {len(new_user_ids)} new users.")
 
     except Exception as e:
         logger.error(f"Error checking for new users: {e}")
+        _requeue(candidates)
 
 def start_background_task():
+    global catalog_snapshot
+    catalog_snapshot = CatalogSnapshot(db).start()
+    _seed_known_users()
+    db.collection('UserData').on_snapshot(on_user_snapshot)
+
     def background_task():
         while True:
+            time.sleep(NEW_USER_BATCH_WINDOW)
             check_for_new_users()
-            time.sleep(10)  
 
     thread = threading.Thread(target=background_task)
     thread.daemon = True
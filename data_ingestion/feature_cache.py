@@ -0,0 +1,104 @@
+import hashlib
+import json
+import time
+from database_management.db_utils import execute_query, execute_non_query, execute_many
+from utils.config import FEATURE_CACHE_MAX_ENTRIES, COMMENT_CACHE_MAX_ENTRIES
+
+def create_feature_cache_table():
+    """Create the per-video NLP feature cache table if it doesn't exist."""
+    execute_non_query('''
+    CREATE TABLE IF NOT EXISTS video_features (
+        content_hash TEXT PRIMARY KEY,
+        payload TEXT,
+        last_used REAL
+    )
+    ''')
+    execute_non_query("CREATE INDEX IF NOT EXISTS idx_video_features_last_used ON video_features (last_used)")
+    execute_non_query('''
+    CREATE TABLE IF NOT EXISTS comment_features (
+        comment_key TEXT PRIMARY KEY,
+        payload TEXT,
+        last_used REAL
+    )
+    ''')
+    execute_non_query("CREATE INDEX IF NOT EXISTS idx_comment_features_last_used ON comment_features (last_used)")
+
+def content_hash(description, comments):
+    """Hash a video's description and comment texts into a cache key."""
+    digest = hashlib.sha256()
+    digest.update(description.encode('utf-8'))
+    for comment in comments:
+        digest.update(b'\0')
+        digest.update(comment["content"].encode('utf-8'))
+    return digest.hexdigest()
+
+def get_features(hashes):
+    """Return cached features for the given content hashes, marking them as recently used."""
+    hashes = list(hashes)
+    features = {}
+    for start in range(0, len(hashes), 500):
+        chunk = hashes[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = execute_query(f"SELECT content_hash, payload FROM video_features WHERE content_hash IN ({placeholders})", chunk) or []
+        features.update((key, json.loads(payload)) for key, payload in rows)
+    if features:
+        now = time.time()
+        execute_many("UPDATE video_features SET last_used = ? WHERE content_hash = ?", [(now, key) for key in features])
+    return features
+
+def put_features(features):
+    """Store features by content hash, then evict the least recently used entries over the size bound."""
+    if not features:
+        return
+    now = time.time()
+    execute_many(
+        "INSERT OR REPLACE INTO video_features (content_hash, payload, last_used) VALUES (?, ?, ?)",
+        [(key, json.dumps(payload), now) for key, payload in features.items()]
+    )
+    execute_non_query('''
+    DELETE FROM video_features WHERE content_hash IN (
+        SELECT content_hash FROM video_features ORDER BY last_used DESC LIMIT -1 OFFSET ?
+    )
+    ''', (FEATURE_CACHE_MAX_ENTRIES,))
+
+# A comment is identified by its video, author, date and text. A comment with a cached
+# entry has already been lemmatised and folded into the topic model, so it is never
+# sent through spaCy or the LDA again unless its entry has been evicted.
+def comment_key(video_id, comment):
+    """Hash one comment of a video into its cache key."""
+    digest = hashlib.sha256()
+    for part in (video_id, comment.get("user", ''), str(comment.get("date")), comment["content"]):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def get_comment_features(keys):
+    """Return cached [lemmas, sentiment] pairs for the given comment keys, marking them as recently used."""
+    keys = list(dict.fromkeys(keys))
+    features = {}
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = execute_query(f"SELECT comment_key, payload FROM comment_features WHERE comment_key IN ({placeholders})", chunk) or []
+        features.update((key, json.loads(payload)) for key, payload in rows)
+    if features:
+        now = time.time()
+        execute_many("UPDATE comment_features SET last_used = ? WHERE comment_key = ?", [(now, key) for key in features])
+    return features
+
+def put_comment_features(features):
+    """Store [lemmas, sentiment] pairs by comment key, then evict the least recently used over the size bound."""
+    if not features:
+        return
+    now = time.time()
+    execute_many(
+        "INSERT OR REPLACE INTO comment_features (comment_key, payload, last_used) VALUES (?, ?, ?)",
+        [(key, json.dumps(payload), now) for key, payload in features.items()]
+    )
+    execute_non_query('''
+    DELETE FROM comment_features WHERE comment_key IN (
+        SELECT comment_key FROM comment_features ORDER BY last_used DESC LIMIT -1 OFFSET ?
+    )
+    ''', (COMMENT_CACHE_MAX_ENTRIES,))
+
+create_feature_cache_table()
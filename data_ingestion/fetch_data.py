@@ -1,82 +1,79 @@
 import logging
 import threading
 from utils.logger import setup_logger
-from firebase_init import db  
-import spacy
-from cache_management.cache_utils import get_cache, set_cache
+from utils.config import INGEST_UPDATED_FIELD, INGEST_COMMENT_DATE_FIELD, INGEST_COMMENT_WORKERS
+from firebase_init import db
+from data_ingestion.ingest_state import (
+    get_watermark, set_watermark, reset_ingest_state, save_users, save_videos, load_users, load_videos
+)
+from data_ingestion.catalog import (
+    changed_documents, advance_watermark, user_payload, comment_payload, fetch_video_catalog, join_users_with_catalog
+)
 
 logger = setup_logger()
 
-nlp = spacy.load("en_core_web_sm")
+fetch_lock = threading.Lock()
 
-cache_lock = threading.Lock()
+def fetch_new_data(full_resync=False):
+    """Fetch records for users and videos changed since the last persisted watermark.
 
-def fetch_new_data():
+    Documents are selected by their INGEST_UPDATED_FIELD timestamp and new comments
+    by INGEST_COMMENT_DATE_FIELD, so Firestore reads scale with churn. Ingested documents
+    are mirrored locally to join changed users against unchanged videos and vice versa.
+    With full_resync the mirror and watermarks are dropped and every document is read.
+    """
     try:
-        with cache_lock:
-            cached_data = get_cache('new_data')
-            if cached_data:
-                return cached_data
+        with fetch_lock:
+            if full_resync:
+                reset_ingest_state()
+                logger.info("Full resync requested; cleared ingest watermarks.")
 
-        users_ref = db.collection('users')
-        videos_ref = db.collection('videos')
+            users_since = get_watermark('users')
+            videos_since = get_watermark('videos')
+            comments_since = get_watermark('comments')
 
-        users = users_ref.stream()
+            users_ref = db.collection('users')
+            videos_ref = db.collection('videos')
 
-        data = []
+            users = load_users()
+            videos = load_videos()
 
-        for user in users:
-            user_data = user.to_dict()
-            user_id = user.id
-            user_interests = user_data.get('tags', [])
-            watched_views = user_data.get('watchedViews', [])
+            changed_users = {}
+            users_watermark = users_since
+            for user in changed_documents(users_ref, INGEST_UPDATED_FIELD, users_since):
+                user_data = user.to_dict()
+                changed_users[user.id] = user_payload(user_data)
+                users_watermark = advance_watermark(users_watermark, user_data.get(INGEST_UPDATED_FIELD))
 
-            videos = videos_ref.stream()  
+            changed_videos, latest_video, latest_comment = fetch_video_catalog(
+                videos_ref, videos_since, videos, comment_workers=INGEST_COMMENT_WORKERS
+            )
+            videos_watermark = advance_watermark(videos_since, latest_video)
+            comments_watermark = advance_watermark(comments_since, latest_comment)
 
-            for video in videos:
-                video_data = video.to_dict()
-                video_id = video.id
-                video_tags = video_data.get('tags', [])
-                video_description = video_data.get('description', '')
-                video_views = video_data.get('views', 0)
-                video_impressions = video_data.get('impressions', 0)
-                video_likes = video_data.get('likes', [])
-                video_comments_count = video_data.get('comcount', 0)
-
-                comments_ref = videos_ref.document(video_id).collection('comments')
-                comments = comments_ref.stream()
-                comments_data = []
-                for comment in comments:
+            if videos_since is not None:
+                new_comments = changed_documents(db.collection_group('comments'), INGEST_COMMENT_DATE_FIELD, comments_since)
+                for comment in new_comments:
+                    video_id = comment.reference.parent.parent.id
+                    video = changed_videos.get(video_id) or videos.get(video_id)
+                    if video is None:
+                        continue
                     comment_data = comment.to_dict()
-                    comments_data.append({
-                        "content": comment_data.get('content', ''),
-                        "date": comment_data.get('date', None),
-                        "dislikes": comment_data.get('dislikes', 0),
-                        "likes": comment_data.get('likes', 0),
-                        "user": comment_data.get('user', '')
-                    })
+                    video["comments"][comment.id] = comment_payload(comment_data)
+                    changed_videos[video_id] = video
+                    comments_watermark = advance_watermark(comments_watermark, comment_data.get(INGEST_COMMENT_DATE_FIELD))
 
-                if '#2x10862CE' in video_tags:
-                    continue
+            users.update(changed_users)
+            videos.update(changed_videos)
+            data = join_users_with_catalog(users, videos, changed_users, changed_videos)
 
-                data.append({
-                    "user_id": user_id,
-                    "interests": user_interests,
-                    "watched_views": watched_views,
-                    "video_id": video_id,
-                    "tags": video_tags,
-                    "description": video_description,
-                    "retention": 0,  
-                    "likes": video_likes,
-                    "comments_count": video_comments_count,
-                    "comments": comments_data,
-                    "impressions": video_impressions,
-                    "views": video_views
-                })
+            save_users(changed_users)
+            save_videos(changed_videos)
+            for collection, watermark in (('users', users_watermark), ('videos', videos_watermark), ('comments', comments_watermark)):
+                if watermark is not None:
+                    set_watermark(collection, watermark)
 
-        with cache_lock:
-            set_cache('new_data', data)
-        logger.info(f"Fetched {len(data)} records from Firebase.")
+        logger.info(f"Fetched {len(data)} records from Firebase ({len(changed_users)} changed users, {len(changed_videos)} changed videos).")
         return data
     except Exception as e:
         logger.error(f"Error fetching new data: {e}")
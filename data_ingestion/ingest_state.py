@@ -0,0 +1,87 @@
+import json
+from datetime import datetime
+from database_management.db_utils import execute_query, execute_non_query, execute_many
+
+def create_ingest_tables():
+    """Create the watermark table and the local mirrors of ingested documents."""
+    execute_non_query('''
+    CREATE TABLE IF NOT EXISTS ingest_watermarks (
+        collection TEXT PRIMARY KEY,
+        watermark TEXT
+    )
+    ''')
+    execute_non_query('''
+    CREATE TABLE IF NOT EXISTS ingest_users (
+        user_id TEXT PRIMARY KEY,
+        payload TEXT
+    )
+    ''')
+    execute_non_query('''
+    CREATE TABLE IF NOT EXISTS ingest_videos (
+        video_id TEXT PRIMARY KEY,
+        payload TEXT
+    )
+    ''')
+
+def get_watermark(collection):
+    """Return the last checkpointed update time for a collection, or None."""
+    result = execute_query("SELECT watermark FROM ingest_watermarks WHERE collection = ?", (collection,))
+    if result and result[0][0]:
+        return datetime.fromisoformat(result[0][0])
+    return None
+
+def set_watermark(collection, watermark):
+    """Persist the update time up to which a collection has been ingested."""
+    execute_non_query(
+        "INSERT OR REPLACE INTO ingest_watermarks (collection, watermark) VALUES (?, ?)",
+        (collection, watermark.isoformat())
+    )
+
+def reset_ingest_state():
+    """Forget all watermarks and mirrored documents so the next fetch is a full resync."""
+    execute_non_query("DELETE FROM ingest_watermarks")
+    execute_non_query("DELETE FROM ingest_users")
+    execute_non_query("DELETE FROM ingest_videos")
+
+def save_users(users):
+    """Upsert mirrored user documents, keyed by user id."""
+    execute_many(
+        "INSERT OR REPLACE INTO ingest_users (user_id, payload) VALUES (?, ?)",
+        [(user_id, json.dumps(payload, default=str)) for user_id, payload in users.items()]
+    )
+
+def save_videos(videos):
+    """Upsert mirrored video documents (including their comments), keyed by video id."""
+    execute_many(
+        "INSERT OR REPLACE INTO ingest_videos (video_id, payload) VALUES (?, ?)",
+        [(video_id, json.dumps(payload, default=str)) for video_id, payload in videos.items()]
+    )
+
+def load_users():
+    """Return every mirrored user document."""
+    rows = execute_query("SELECT user_id, payload FROM ingest_users") or []
+    return {user_id: json.loads(payload) for user_id, payload in rows}
+
+def load_user_ids():
+    """Return the ids of every mirrored user."""
+    rows = execute_query("SELECT user_id FROM ingest_users") or []
+    return [user_id for (user_id,) in rows]
+
+def load_user_interests(user_ids):
+    """Return {user_id: lowercased profile interests} for the given users; [] for users not mirrored yet."""
+    user_ids = list(user_ids)
+    interests = {user_id: [] for user_id in user_ids}
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = execute_query(f"SELECT user_id, payload FROM ingest_users WHERE user_id IN ({placeholders})", chunk) or []
+        for user_id, payload in rows:
+            interests[user_id] = [interest.lower() for interest in json.loads(payload).get("interests", [])]
+    return interests
+
+def load_videos():
+    """Return every mirrored video document."""
+    rows = execute_query("SELECT video_id, payload FROM ingest_videos") or []
+    return {video_id: json.loads(payload) for video_id, payload in rows}
+
+create_ingest_tables()
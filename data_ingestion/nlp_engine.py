@@ -0,0 +1,93 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from utils.config import NLP_BATCH_SIZE, NLP_PROCESSES
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Lemmatisation only needs the tagger, attribute ruler and lemmatizer.
+DISABLED_PIPES = ["parser", "ner"]
+
+_nlp = None
+_sia = None
+
+def _load_pipelines():
+    """Load spaCy and VADER once per process."""
+    global _nlp, _sia
+    if _nlp is None:
+        import spacy
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        _nlp = spacy.load("en_core_web_sm", disable=DISABLED_PIPES)
+        _sia = SentimentIntensityAnalyzer()
+
+def process_texts(texts, batch_size=NLP_BATCH_SIZE):
+    """Lemmatise texts (dropping stop words) and score the sentiment of each lemmatised text."""
+    _load_pipelines()
+    results = []
+    for doc in _nlp.pipe(texts, batch_size=batch_size):
+        lemmas = [token.lemma_ for token in doc if not token.is_stop]
+        results.append((lemmas, _sia.polarity_scores(" ".join(lemmas))))
+    return results
+
+class NLPEngine:
+    """Streams texts through spaCy's nlp.pipe, optionally spread across a process pool.
+
+    The pool is forked by start(), which the entry points call at startup before any
+    TF, Firestore or Redis threads exist: a fork taken later can inherit their locks in
+    a held state, and spawn would re-run the entry point's __main__ (TensorFlow,
+    Firebase, schema setup) in every worker. Until start() has run, texts are
+    processed in the calling process.
+    """
+
+    def __init__(self, n_process=NLP_PROCESSES, batch_size=NLP_BATCH_SIZE):
+        self.n_process = max(1, n_process or os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def start(self):
+        """Fork the worker pool now; each worker loads spaCy and VADER once."""
+        with self._pool_lock:
+            if self._pool is None and self.n_process > 1:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.n_process,
+                    mp_context=multiprocessing.get_context('fork'),
+                    initializer=_load_pipelines
+                )
+                # A fork pool launches all its workers on the first submit.
+                self._pool.submit(int).result()
+        return self
+
+    def process(self, texts):
+        """Return (lemmas, sentiment) for every text, in input order."""
+        texts = list(texts)
+        chunk_size = self.batch_size * 4
+        pool = self._pool
+        if pool is None or len(texts) <= chunk_size:
+            return process_texts(texts, self.batch_size)
+
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        results = []
+        for chunk_results in pool.map(process_texts, chunks, [self.batch_size] * len(chunks)):
+            results.extend(chunk_results)
+        return results
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Return the process-wide NLP engine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = NLPEngine()
+            logger.info(f"Started NLP engine with {_engine.n_process} processes, batch size {_engine.batch_size}.")
+        return _engine
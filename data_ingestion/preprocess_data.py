@@ -1,23 +1,18 @@
 import logging
-import threading
 from utils.logger import setup_logger
 import time
 import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
-from gensim import corpora
-from gensim.models import LdaModel
-import spacy
+from itertools import chain
+from data_ingestion.nlp_engine import get_engine
+from data_ingestion.topic_model import get_topic_model
+from data_ingestion.feature_cache import (
+    content_hash, get_features, put_features, comment_key, get_comment_features, put_comment_features
+)
 
 nltk.download('vader_lexicon')
 
-sia = SentimentIntensityAnalyzer()
-
 logger = setup_logger()
 
-nlp = spacy.load("en_core_web_sm")
-
-data_lock = threading.Lock()
-
 def validate_data(record):
     required_fields = ["user_id", "video_id", "description", "views", "impressions"]
     for field in required_fields:
@@ -26,9 +21,65 @@ def validate_data(record):
             return False
     return True
 
+def extract_video_features(videos):
+    """Lemmatise, sentiment-score and topic-model each video's text once, keyed by content hash.
+
+    Comments seen in an earlier run reuse their cached lemmas and sentiment; only new
+    comments go through spaCy and are folded into the topic model.
+    """
+    comment_keys = {
+        key: [comment_key(record["video_id"], comment) for comment in record["comments"]]
+        for key, record in videos.items()
+    }
+    cached = get_comment_features(chain.from_iterable(comment_keys.values()))
+
+    texts = []
+    offsets = {}
+    new_comments = {}
+    for key, record in videos.items():
+        offsets[key] = len(texts)
+        texts.append(record["description"])
+    for key, record in videos.items():
+        for ckey, comment in zip(comment_keys[key], record["comments"]):
+            if ckey not in cached and ckey not in new_comments:
+                new_comments[ckey] = len(texts)
+                texts.append(comment["content"])
+
+    if not texts:
+        return {}
+
+    nlp_start = time.time()
+    results = get_engine().process(texts)
+    nlp_seconds = max(time.time() - nlp_start, 1e-9)
+    logger.info(f"Processed {len(texts)} texts in {nlp_seconds:.2f} seconds ({len(texts) / nlp_seconds:.0f} texts/s); {len(cached)} comments were cached.")
+
+    fresh = {ckey: list(results[offset]) for ckey, offset in new_comments.items()}
+    topic_model = get_topic_model()
+    topic_model.update(lemmas for lemmas, _ in fresh.values())
+    put_comment_features(fresh)
+    cached.update(fresh)
+
+    features = {}
+    for key, record in videos.items():
+        try:
+            description, description_sentiment = results[offsets[key]]
+            comment_results = [cached[ckey] for ckey in comment_keys[key]]
+            comments = [lemmas for lemmas, _ in comment_results]
+
+            features[key] = {
+                "description": description,
+                "description_sentiment": description_sentiment,
+                "comments": comments,
+                "comments_sentiment": [sentiment for _, sentiment in comment_results],
+                "comments_topics": topic_model.infer(comments)
+            }
+        except Exception as e:
+            logger.error(f"Error extracting features for video_id: {record['video_id']}: {e}")
+    return features
+
 def preprocess_data(data):
     start_time = time.time()
-    preprocessed_data = []
+    records = []
     for record in data:
         try:
             if not validate_data(record):
@@ -38,52 +89,41 @@ def preprocess_data(data):
 
             views = record.get("views", 0)
             impressions = record.get("impressions", 1)  
-            retention_score = (views / impressions) * 100
-            record["retention"] = retention_score
-            logger.info(f"Calculated retention score: {retention_score:.2f}%")
+            record["retention"] = (views / impressions) * 100
 
-            original_interests = record["interests"]
-            original_tags = record["tags"]
             record["interests"] = [interest.lower() for interest in record["interests"]]
             record["tags"] = [tag.lower() for tag in record["tags"]]
-            logger.info(f"Converted interests from {original_interests} to {record['interests']}")
-            logger.info(f"Converted tags from {original_tags} to {record['tags']}")
-
-            doc = nlp(record["description"])
-            original_description = record["description"]
-            record["description"] = [token.lemma_ for token in doc if not token.is_stop]
-            logger.info(f"Processed description from '{original_description}' to '{record['description']}'")
-
-            sentiment = sia.polarity_scores(" ".join(record["description"]))
-            record["description_sentiment"] = sentiment
-            logger.info(f"Sentiment analysis on description: {sentiment}")
-
-            comments_texts = []
-            for comment in record["comments"]:
-                comment_doc = nlp(comment["content"])
-                comment["content"] = [token.lemma_ for token in comment_doc if not token.is_stop]
-                comments_texts.append(" ".join(comment["content"]))
-                logger.info(f"Processed comment: {comment['content']}")
-
-            comments_sentiment = [sia.polarity_scores(comment) for comment in comments_texts]
-            record["comments_sentiment"] = comments_sentiment
-            logger.info(f"Sentiment analysis on comments: {comments_sentiment}")
-
-            dictionary = corpora.Dictionary([comment.split() for comment in comments_texts])
-            corpus = [dictionary.doc2bow(comment.split()) for comment in comments_texts]
-            lda_model = LdaModel(corpus, num_topics=5, id2word=dictionary, passes=15)
-            topics = lda_model.print_topics(num_words=4)
-            record["comments_topics"] = topics
-            logger.info(f"Topic modeling on comments: {topics}")
-
-            watched_views = record["watched_views"]
-            record["watched_views"] = [view.rstrip('X') for view in watched_views]
-            logger.info(f"Processed watched_views: {record['watched_views']}")
-
-            with data_lock:
-                preprocessed_data.append(record)
+            record["watched_views"] = [view.rstrip('X') for view in record["watched_views"]]
+            records.append(record)
         except Exception as e:
-            logger.error(f"Error preprocessing data for user_id: {record['user_id']} and video_id: {record['video_id']}: {e}")
+            logger.error(f"Error preprocessing data for user_id: {record.get('user_id')} and video_id: {record.get('video_id')}: {e}")
+
+    videos = {}
+    for record in records:
+        record["content_hash"] = content_hash(record["description"], record["comments"])
+        videos.setdefault(record["content_hash"], record)
+
+    features = get_features(videos.keys())
+    missing = {key: record for key, record in videos.items() if key not in features}
+    logger.info(f"Feature cache: {len(videos) - len(missing)} of {len(videos)} unique videos cached.")
+
+    features.update(extract_video_features(missing))
+    put_features({key: features[key] for key in missing if key in features})
+
+    preprocessed_data = []
+    for record in records:
+        video_features = features.get(record.pop("content_hash"))
+        if video_features is None:
+            continue
+
+        record["description"] = video_features["description"]
+        record["description_sentiment"] = video_features["description_sentiment"]
+        record["comments"] = [
+            dict(comment, content=lemmas) for comment, lemmas in zip(record["comments"], video_features["comments"])
+        ]
+        record["comments_sentiment"] = video_features["comments_sentiment"]
+        record["comments_topics"] = video_features["comments_topics"]
+        preprocessed_data.append(record)
 
     end_time = time.time()
     logger.info(f"Preprocessing completed in {end_time - start_time:.2f} seconds.")
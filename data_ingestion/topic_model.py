@@ -0,0 +1,72 @@
+import os
+import threading
+from gensim.corpora import HashDictionary
+from gensim.models import LdaModel
+from utils.config import TOPIC_MODEL_DIR, TOPIC_COUNT, TOPIC_VOCAB_SIZE, TOPIC_CHUNK_SIZE
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+class TopicModel:
+    """Corpus-wide LDA over comment lemmas, trained online in mini-batches.
+
+    A HashDictionary maps tokens into a fixed id range, so the vocabulary can keep
+    growing with new comments without resizing the LDA term matrix.
+    """
+
+    def __init__(self, model_dir=TOPIC_MODEL_DIR, num_topics=TOPIC_COUNT, vocab_size=TOPIC_VOCAB_SIZE, chunk_size=TOPIC_CHUNK_SIZE):
+        self.model_dir = model_dir
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._dictionary_path = os.path.join(model_dir, 'dictionary')
+        self._model_path = os.path.join(model_dir, 'lda.model')
+
+        self._trained = os.path.exists(self._model_path) and os.path.exists(self._dictionary_path)
+        if self._trained:
+            self.dictionary = HashDictionary.load(self._dictionary_path)
+            # Dictionaries saved before debug was switched off carry a token map; drop it.
+            self.dictionary.debug = False
+            self.dictionary.token2id = {}
+            self.dictionary.id2token = {}
+            self.dictionary.dfs_debug = {}
+            self.lda = LdaModel.load(self._model_path)
+            logger.info(f"Loaded topic model from {model_dir}.")
+        else:
+            # debug=False: don't keep every token string seen, so memory stays bounded by id_range.
+            self.dictionary = HashDictionary(id_range=vocab_size, debug=False)
+            self.lda = LdaModel(id2word=self.dictionary, num_topics=num_topics, chunksize=chunk_size)
+
+    def update(self, documents):
+        """Fold new tokenised comments into the model and persist it."""
+        corpus = [self.dictionary.doc2bow(tokens, allow_update=True) for tokens in documents if tokens]
+        if not corpus:
+            return
+        with self._lock:
+            for start in range(0, len(corpus), self.chunk_size):
+                self.lda.update(corpus[start:start + self.chunk_size], chunksize=self.chunk_size)
+            self._trained = True
+            os.makedirs(self.model_dir, exist_ok=True)
+            self.dictionary.save(self._dictionary_path)
+            self.lda.save(self._model_path)
+        logger.info(f"Updated topic model with {len(corpus)} comments.")
+
+    def infer(self, documents):
+        """Return the topic distribution [(topic_id, weight), ...] of a bag of tokenised comments."""
+        tokens = [token for document in documents for token in document]
+        if not tokens or not self._trained:
+            return []
+        bow = self.dictionary.doc2bow(tokens)
+        with self._lock:
+            topics = self.lda.get_document_topics(bow, minimum_probability=0.01)
+        return [(int(topic_id), float(weight)) for topic_id, weight in topics]
+
+_topic_model = None
+_topic_model_lock = threading.Lock()
+
+def get_topic_model():
+    """Return the process-wide topic model, loading it from disk on first use."""
+    global _topic_model
+    with _topic_model_lock:
+        if _topic_model is None:
+            _topic_model = TopicModel()
+        return _topic_model
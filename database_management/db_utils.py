@@ -1,7 +1,9 @@
 import sqlite3
 import logging
 import threading
+import time
 from contextlib import contextmanager
+from utils.config import SQLITE_DB_PATH, SQLITE_CACHE_SIZE_KB, SQLITE_BULK_CHUNK_SIZE, STATS_BUCKET_SECONDS
 
 logger = logging.getLogger("DBUtils")
 logger.setLevel(logging.INFO)
@@ -10,39 +12,97 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-db_lock = threading.Lock()
+def configure_connection(conn):
+    """WAL journaling with NORMAL sync: durable at checkpoints, no fsync per commit."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
 
 class SQLiteConnectionPool:
-    def __init__(self, database, pool_size=5):
+    """Per-thread SQLite connections: concurrent read-only readers and one serialised writer.
+
+    Under WAL, readers never block on the writer, so only write checkouts take the
+    writer lock. Checkout counts and writer wait time are kept for get_stats().
+    """
+
+    def __init__(self, database):
         self.database = database
-        self.pool_size = pool_size
-        self.pool = [self._create_connection() for _ in range(pool_size)]
+        self._local = threading.local()
+        self._writer_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "read_checkouts": 0,
+            "write_checkouts": 0,
+            "write_wait_seconds": 0.0,
+            "max_write_wait_seconds": 0.0,
+            "connections_opened": 0
+        }
+        # Create the database file and switch it to WAL before any read-only connection opens it.
+        conn = self._create_connection(read_only=False)
+        conn.close()
+
+    def _create_connection(self, read_only):
+        if read_only:
+            conn = sqlite3.connect(f"file:{self.database}?mode=ro", uri=True)
+            conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        else:
+            conn = sqlite3.connect(self.database)
+            configure_connection(conn)
+        with self._stats_lock:
+            self._stats["connections_opened"] += 1
+        return conn
 
-    def _create_connection(self):
-        return sqlite3.connect(self.database, check_same_thread=False)
+    def _thread_connection(self, read_only):
+        name = 'reader' if read_only else 'writer'
+        conn = getattr(self._local, name, None)
+        if conn is None:
+            conn = self._create_connection(read_only)
+            setattr(self._local, name, conn)
+        return conn
 
     @contextmanager
-    def get_connection(self):
-        with db_lock:
-            conn = self.pool.pop() if self.pool else self._create_connection()
-        try:
+    def read_connection(self):
+        """Yield this thread's read-only connection."""
+        conn = self._thread_connection(read_only=True)
+        with self._stats_lock:
+            self._stats["read_checkouts"] += 1
+        yield conn
+
+    @contextmanager
+    def write_connection(self):
+        """Yield this thread's read-write connection while holding the single writer slot."""
+        conn = self._thread_connection(read_only=False)
+        start = time.perf_counter()
+        with self._writer_lock:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self._stats["write_checkouts"] += 1
+                self._stats["write_wait_seconds"] += waited
+                self._stats["max_write_wait_seconds"] = max(self._stats["max_write_wait_seconds"], waited)
             yield conn
-        finally:
-            with db_lock:
-                self.pool.append(conn)
 
-db_pool = SQLiteConnectionPool('data.db')
+    get_connection = write_connection
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+db_pool = SQLiteConnectionPool(SQLITE_DB_PATH)
+
+def get_pool_stats():
+    """Return connection checkout and writer wait metrics for the shared pool."""
+    return db_pool.get_stats()
 
 def execute_query(query, params=None):
-    """Execute a query and return the results."""
-    with db_pool.get_connection() as conn:
+    """Execute a read-only query and return the results."""
+    with db_pool.read_connection() as conn:
         cursor = conn.cursor()
         try:
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            conn.commit()
             return cursor.fetchall()
         except sqlite3.Error as e:
             logger.error(f"Database error: {e}")
@@ -50,7 +110,7 @@ def execute_query(query, params=None):
 
 def execute_non_query(query, params=None):
     """Execute a query that does not return results."""
-    with db_pool.get_connection() as conn:
+    with db_pool.write_connection() as conn:
         cursor = conn.cursor()
         try:
             if params:
@@ -61,39 +121,207 @@ def execute_non_query(query, params=None):
         except sqlite3.Error as e:
             logger.error(f"Database error: {e}")
 
+def execute_many(query, params_seq):
+    """Execute a query once per parameter tuple in a single transaction."""
+    with db_pool.write_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(query, params_seq)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Database error: {e}")
+
+DATA_COLUMNS = ["user_id", "video_id", "interests", "tags", "description", "retention", "likes", "comments", "correlate", "impressions", "views"]
+
+DATA_TABLE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS data (
+    user_id TEXT NOT NULL, 
+    video_id TEXT NOT NULL, 
+    interests TEXT, 
+    tags TEXT, 
+    description TEXT, 
+    retention REAL, 
+    likes INTEGER, 
+    comments INTEGER, 
+    correlate REAL,
+    impressions INTEGER DEFAULT 0,
+    views INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, video_id)
+)
+'''
+
+# Aggregates kept in step with the data table inside the same write transaction.
+# video_stats holds each video's latest counters; triggers on it fold every change
+# into the single global_stats row and into per-video time buckets, so readers
+# never scan the data table.
+STATS_SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS video_stats (
+    video_id TEXT PRIMARY KEY,
+    impressions INTEGER NOT NULL DEFAULT 0,
+    views INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS global_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    impressions INTEGER NOT NULL DEFAULT 0,
+    views INTEGER NOT NULL DEFAULT 0,
+    video_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO global_stats (id) VALUES (1);
+
+CREATE TABLE IF NOT EXISTS video_stats_buckets (
+    video_id TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    impressions INTEGER NOT NULL DEFAULT 0,
+    views INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (video_id, bucket_start)
+);
+
+DROP TRIGGER IF EXISTS video_stats_after_insert;
+CREATE TRIGGER video_stats_after_insert AFTER INSERT ON video_stats
+BEGIN
+    UPDATE global_stats SET
+        impressions = impressions + NEW.impressions,
+        views = views + NEW.views,
+        video_count = video_count + 1
+    WHERE id = 1;
+    INSERT INTO video_stats_buckets (video_id, bucket_start, impressions, views)
+    VALUES (NEW.video_id, CAST(strftime('%s', 'now') AS INTEGER) / {STATS_BUCKET_SECONDS} * {STATS_BUCKET_SECONDS}, NEW.impressions, NEW.views)
+    ON CONFLICT (video_id, bucket_start) DO UPDATE SET
+        impressions = impressions + excluded.impressions,
+        views = views + excluded.views;
+END;
+
+DROP TRIGGER IF EXISTS video_stats_after_update;
+CREATE TRIGGER video_stats_after_update AFTER UPDATE ON video_stats
+WHEN NEW.impressions != OLD.impressions OR NEW.views != OLD.views
+BEGIN
+    UPDATE global_stats SET
+        impressions = impressions + NEW.impressions - OLD.impressions,
+        views = views + NEW.views - OLD.views
+    WHERE id = 1;
+    INSERT INTO video_stats_buckets (video_id, bucket_start, impressions, views)
+    VALUES (NEW.video_id, CAST(strftime('%s', 'now') AS INTEGER) / {STATS_BUCKET_SECONDS} * {STATS_BUCKET_SECONDS},
+            NEW.impressions - OLD.impressions, NEW.views - OLD.views)
+    ON CONFLICT (video_id, bucket_start) DO UPDATE SET
+        impressions = impressions + excluded.impressions,
+        views = views + excluded.views;
+END;
+'''
+
+UPSERT_VIDEO_STATS_QUERY = '''
+INSERT INTO video_stats (video_id, impressions, views) VALUES (?, ?, ?)
+ON CONFLICT (video_id) DO UPDATE SET
+    impressions = excluded.impressions,
+    views = excluded.views
+'''
+
+UPSERT_DATA_QUERY = f'''
+INSERT INTO data ({", ".join(DATA_COLUMNS)}) VALUES ({", ".join("?" * len(DATA_COLUMNS))})
+ON CONFLICT (user_id, video_id) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}" for column in DATA_COLUMNS[2:])}
+'''
+
+def _add_missing_columns(conn):
+    """Add the counter columns to a data table created before they existed."""
+    existing = {column[1] for column in conn.execute("PRAGMA table_info(data)").fetchall()}
+    if not existing:
+        return
+    for column in ("impressions", "views"):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE data ADD COLUMN {column} INTEGER DEFAULT 0")
+
+def _migrate_legacy_table(conn):
+    """Rebuild a data table created before it had a (user_id, video_id) primary key."""
+    columns = conn.execute("PRAGMA table_info(data)").fetchall()
+    if not columns or any(column[5] for column in columns):
+        return
+    logger.info("Migrating data table to a (user_id, video_id) primary key.")
+    conn.execute("ALTER TABLE data RENAME TO data_legacy")
+    conn.execute(DATA_TABLE_SCHEMA)
+    conn.execute(f'''
+    INSERT OR REPLACE INTO data ({", ".join(DATA_COLUMNS)})
+    SELECT {", ".join(DATA_COLUMNS)} FROM data_legacy
+    WHERE user_id IS NOT NULL AND video_id IS NOT NULL
+    ''')
+    conn.execute("DROP TABLE data_legacy")
+
+def _execute_statements(conn, script):
+    """Run a multi-statement script one statement at a time.
+
+    Unlike executescript, this doesn't commit first, so the script joins the caller's transaction.
+    """
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ''
+
 def create_table():
-    """Create the data table if it doesn't exist."""
-    query = '''
-    CREATE TABLE IF NOT EXISTS data (
-        user_id TEXT, 
-        video_id TEXT, 
-        interests TEXT, 
-        tags TEXT, 
-        description TEXT, 
-        retention REAL, 
-        likes INTEGER, 
-        comments INTEGER, 
-        correlate REAL
-    )
-    '''
-    execute_non_query(query)
+    """Create the data and aggregate tables if they don't exist, in a single transaction."""
+    with db_pool.write_connection() as conn:
+        try:
+            # sqlite3 only opens transactions implicitly before DML, so begin explicitly
+            # to make the migrations and schema changes commit or roll back together.
+            conn.execute("BEGIN")
+            _add_missing_columns(conn)
+            _migrate_legacy_table(conn)
+            conn.execute(DATA_TABLE_SCHEMA)
+            _execute_statements(conn, STATS_SCHEMA)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Database error: {e}")
 
-def insert_data(record):
-    """Insert a record into the data table."""
-    query = '''
-    INSERT OR REPLACE INTO data (
-        user_id, video_id, interests, tags, description, retention, likes, comments, correlate
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    '''
-    params = (
+def record_params(record):
+    """Return the data-table row for a record, in DATA_COLUMNS order."""
+    description = record["description"]
+    if isinstance(description, list):
+        description = ' '.join(description)
+    likes = record["likes"]
+    return (
         record["user_id"], 
         record["video_id"], 
         ','.join(record["interests"]), 
         ','.join(record["tags"]), 
-        ' '.join(record["description"]), 
+        description, 
         record["retention"], 
-        record["likes"], 
-        record["comments"], 
-        record["correlate"]
+        len(likes) if isinstance(likes, list) else likes, 
+        record.get("comments_count", 0), 
+        record.get("correlate", 0.0), 
+        record.get("impressions", 0), 
+        record.get("views", 0)
     )
-    execute_non_query(query, params)
+
+def _video_stats_params(records):
+    # A video's counters repeat on every (user, video) record; the last one seen wins.
+    latest = {record["video_id"]: (record.get("impressions", 0), record.get("views", 0)) for record in records}
+    return [(video_id, impressions, views) for video_id, (impressions, views) in latest.items()]
+
+def insert_data(record):
+    """Insert or update a record in the data table."""
+    bulk_upsert([record])
+
+def upsert_records(conn, records, chunk_size=SQLITE_BULK_CHUNK_SIZE):
+    """Upsert records and their video aggregates with executemany, one transaction per chunk."""
+    written = 0
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        rows = [record_params(record) for record in chunk]
+        try:
+            conn.executemany(UPSERT_DATA_QUERY, rows)
+            conn.executemany(UPSERT_VIDEO_STATS_QUERY, _video_stats_params(chunk))
+            conn.commit()
+            written += len(rows)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Database error while upserting {len(rows)} records: {e}")
+    return written
+
+def bulk_upsert(records, chunk_size=SQLITE_BULK_CHUNK_SIZE):
+    """Upsert many records into the data table while holding the writer slot."""
+    with db_pool.write_connection() as conn:
+        return upsert_records(conn, records, chunk_size)
@@ -1,21 +1,44 @@
-import threading
-from database_management.db_utils import create_table, insert_data, execute_query
+import time
+from database_management.db_utils import create_table, bulk_upsert, execute_query
+from utils.config import STATS_BUCKET_SECONDS
 
 create_table()
 
-db_lock = threading.Lock()
-
 def update_database(data):
     """Update the SQLite database with new data."""
-    with db_lock:
-        for record in data:
-            insert_data(record)
+    bulk_upsert(data)
 
 def get_total_impressions_and_views():
     """Get the total video impressions and views."""
-    query = "SELECT SUM(impressions), SUM(views) FROM data"
-    with db_lock:
-        result = execute_query(query)
+    result = execute_query("SELECT impressions, views FROM global_stats WHERE id = 1")
     if result:
         return result[0][0], result[0][1]
     return 0, 0
+
+def get_video_stats(video_id):
+    """Get the latest impressions and views for one video, or None if it was never ingested."""
+    result = execute_query("SELECT impressions, views FROM video_stats WHERE video_id = ?", (video_id,))
+    if result:
+        return result[0][0], result[0][1]
+    return None
+
+def get_video_stats_history(video_id, since=None):
+    """Get (bucket_start, impressions, views) deltas for one video, oldest first.
+
+    Each bucket covers STATS_BUCKET_SECONDS and holds the change observed during it.
+    """
+    if since is None:
+        since = time.time() - 24 * 3600
+    bucket_start = int(since) // STATS_BUCKET_SECONDS * STATS_BUCKET_SECONDS
+    return execute_query(
+        "SELECT bucket_start, impressions, views FROM video_stats_buckets "
+        "WHERE video_id = ? AND bucket_start >= ? ORDER BY bucket_start",
+        (video_id, bucket_start)
+    ) or []
+
+def get_popular_videos(limit):
+    """Get the ids of the most viewed videos, most viewed first."""
+    rows = execute_query(
+        "SELECT video_id FROM video_stats ORDER BY views DESC, impressions DESC LIMIT ?", (limit,)
+    ) or []
+    return [row[0] for row in rows]
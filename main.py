@@ -8,13 +8,22 @@ import signal
 from concurrent.futures import ThreadPoolExecutor
 from data_ingestion.fetch_data import fetch_new_data
 from data_ingestion.preprocess_data import preprocess_data
+from data_ingestion.nlp_engine import get_engine
 from model_training.train_model import train_model
-from model_serving.inference import load_model, recommend, fetch_user_and_video_ids
-from cache_management.cache_utils import set_cache, get_cache
-from database_management.sqlite_db import update_database
+from model_training.update_model import update_model
+from model_training.checkpoint import needs_full_retrain, request_full_retrain
+from model_training.input_pipeline import write_shards
+from model_serving.embedding_index import catalog_signature
+from data_ingestion.ingest_state import load_user_ids
+from model_serving.embedding_store import get_store_handle
+from model_serving.model_registry import current_model_dir
+from model_serving.materialize import materialize_recommendations, lookup_or_score
+from model_serving.write_back import write_back
+from model_serving.fallback import store_popular
+from database_management.sqlite_db import update_database, get_popular_videos
 from utils.logger import setup_logger
-from utils.config import MODEL_DIR, SCHEDULE_TIMES, BATCH_SIZE
-from data_ingestion.check_new_user import check_for_new_users, start_background_task
+from utils.config import MODEL_DIR, SCHEDULE_TIMES, BATCH_SIZE, FALLBACK_LIST_SIZE
+from data_ingestion.check_new_user import check_for_new_users, start_background_task, current_catalog
 from firebase_init import db  
 
 sys.path.insert(0, MODEL_DIR)
@@ -34,30 +43,74 @@ def model_exists(model_dir):
     video_model_path = os.path.join(model_dir, 'video_model', 'saved_model.pb')
     return os.path.exists(user_model_path) and os.path.exists(video_model_path)
 
+def refresh_popular_fallback():
+    """Rebuild the cold-start popularity list from the video stats aggregates."""
+    store_popular(get_popular_videos(FALLBACK_LIST_SIZE))
+
+def scoring_catalog(model):
+    """Video ids and signature to score against, without reading Firestore.
+
+    Uses the live catalog snapshot, or the model's exported video vocabulary when no
+    snapshot has been loaded in this process.
+    """
+    catalog = current_catalog()
+    if catalog is not None and catalog.video_ids:
+        return list(catalog.video_ids), catalog.signature
+    video_ids = list(model.video_rows)
+    return video_ids, catalog_signature(video_ids)
+
+def materialize_all():
+    """Swap to the freshly published model and store top-k lists for every user in Redis."""
+    model_handle = get_store_handle()
+    model_handle.refresh()
+    model = model_handle.get()
+    if model is None:
+        return 0
+    # Users come from the local ingest mirror, so this doesn't stream the users collection.
+    user_ids = load_user_ids()
+    video_ids, signature = scoring_catalog(model)
+    if not user_ids or not video_ids:
+        logger.warning("No users or videos ingested yet. Skipping materialization.")
+        return 0
+    return materialize_recommendations(model, user_ids, video_ids, signature=signature)
+
 async def core_loop():
     global processed_data
     try:
         logger.info("Starting new iteration of core loop.")
         
+        # fetch_data has already run these records through preprocess_data.
         with data_lock:
-            preprocessed_data = await asyncio.get_event_loop().run_in_executor(executor, preprocess_data, processed_data)
+            preprocessed_data = list(processed_data)
         
-        model = await asyncio.get_event_loop().run_in_executor(executor, train_model, preprocessed_data)
+        if await asyncio.get_event_loop().run_in_executor(executor, needs_full_retrain):
+            logger.info("Running full retrain.")
+            model = await asyncio.get_event_loop().run_in_executor(executor, train_model)
+        else:
+            logger.info("Running incremental warm-start update.")
+            model = await asyncio.get_event_loop().run_in_executor(executor, update_model)
         
-        await asyncio.get_event_loop().run_in_executor(executor, set_cache, 'model', model)
         await asyncio.get_event_loop().run_in_executor(executor, update_database, preprocessed_data)
+        await asyncio.get_event_loop().run_in_executor(executor, refresh_popular_fallback)
+
+        if model is not None:
+            await asyncio.get_event_loop().run_in_executor(executor, materialize_all)
         
         logger.info("Iteration complete.")
     except Exception as e:
         logger.error(f"Error in core loop: {e}", exc_info=True)
 
-async def fetch_data():
+async def fetch_data(full_resync=False):
     global processed_data
     try:
         logger.info("Fetching new data from Firebase.")
         
-        new_data = await asyncio.get_event_loop().run_in_executor(executor, fetch_new_data)
+        new_data = await asyncio.get_event_loop().run_in_executor(executor, fetch_new_data, full_resync)
         preprocessed_data = await asyncio.get_event_loop().run_in_executor(executor, preprocess_data, new_data)
+        await asyncio.get_event_loop().run_in_executor(executor, write_shards, preprocessed_data)
+        if full_resync:
+            # The resync re-appended the whole history; the full retrain compacts it.
+            await asyncio.get_event_loop().run_in_executor(executor, request_full_retrain)
         
         with data_lock:
             processed_data.extend(preprocessed_data)
@@ -68,50 +121,38 @@ async def fetch_data():
 
 async def write_to_firebase():
     global processed_data
-    if processed_data:
-        try:
-            logger.info("Writing processed data to Firebase.")
-            
-            model = await asyncio.get_event_loop().run_in_executor(executor, load_model, MODEL_DIR)
-            if model is None:
-                logger.warning("Model not loaded. Skipping write to Firebase.")
-                return
-            
-            user_ids, video_ids = await asyncio.get_event_loop().run_in_executor(executor, fetch_user_and_video_ids)
-
-            if not user_ids or not video_ids:
-                logger.error("No users or videos found in Firebase.")
-                return
-
-            batch_size = BATCH_SIZE
-            with data_lock:
-                for i in range(0, len(processed_data), batch_size):
-                    batch = processed_data[i:i + batch_size]
-                    
-                    for record in batch:
-                        user_id = record["user_id"]
-                        recommendations = await asyncio.get_event_loop().run_in_executor(executor, recommend, user_id, model, video_ids)
-                        
-                        user_ref = db.collection('UserData').document(user_id)
-                        user_data = user_ref.get().to_dict()
-                        watched_views = user_data.get('watchedViews', [])
-
-                        algs_ref = user_ref.collection('algs').document('discover')
-                        current_recommendations = algs_ref.get().to_dict().get('vid', [])
-
-                        updated_recommendations = [rec for rec in current_recommendations if rec not in watched_views]
-
-                        updated_recommendations.extend(recommendations)
-
-                        await asyncio.get_event_loop().run_in_executor(executor, algs_ref.update, {
-                            'vid': updated_recommendations
-                        })
-                
-                processed_data = []
-        except Exception as e:
-            logger.error(f"Error writing to Firebase: {e}", exc_info=True)
-    else:
+    with data_lock:
+        pending = list(processed_data)
+    if not pending:
         logger.info("No data to write to Firebase.")
+        return
+    try:
+        logger.info("Writing processed data to Firebase.")
+
+        model = get_store_handle().get()
+        if model is None:
+            logger.warning("Model not loaded. Skipping write to Firebase.")
+            return
+
+        video_ids, signature = scoring_catalog(model)
+
+        if not video_ids:
+            logger.error("No videos to recommend.")
+            return
+
+        def recommend_fn(target_user_ids, watched):
+            return lookup_or_score(target_user_ids, model, video_ids, 10, BATCH_SIZE, signature=signature, exclude_ids=watched)
+
+        written = await asyncio.get_event_loop().run_in_executor(
+            executor, write_back, db, [record["user_id"] for record in pending], recommend_fn
+        )
+        logger.info(f"Wrote recommendations for {written} users to Firebase.")
+
+        # Records fetched while the write-back ran stay queued for the next one.
+        with data_lock:
+            processed_data = processed_data[len(pending):]
+    except Exception as e:
+        logger.error(f"Error writing to Firebase: {e}", exc_info=True)
 
 def schedule_tasks():
     for time_str in SCHEDULE_TIMES:
@@ -133,10 +174,13 @@ def signal_handler(sig, frame):
 
 if __name__ == "__main__":
     try:
+        # Fork the NLP workers before any background threads start.
+        get_engine().start()
+
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
 
-        if model_exists(MODEL_DIR):
+        if model_exists(current_model_dir()):
             scheduler_thread = threading.Thread(target=schedule_tasks)
             scheduler_thread.start()
 
@@ -0,0 +1,83 @@
+import numpy as np
+from utils.config import ANN_NUM_PROBES, ANN_KMEANS_ITERATIONS
+
+class IVFIndex:
+    """Inverted-file index for approximate maximum inner product search.
+
+    Vectors are partitioned by k-means into ``n_lists`` inverted lists stored
+    contiguously. A query only scores the vectors of the ``n_probe`` lists whose
+    centroids have the highest inner product with it.
+    """
+
+    def __init__(self, embeddings: np.ndarray, n_lists: int = None, n_iter: int = ANN_KMEANS_ITERATIONS, seed: int = 0):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        n_vectors = len(embeddings)
+        if n_vectors == 0:
+            # Empty catalog: a single empty list, so every search returns no rows.
+            self.centroids = np.zeros((1, embeddings.shape[1] if embeddings.ndim == 2 else 0), dtype=np.float32)
+            self.list_offsets = np.zeros(2, dtype=np.int64)
+            self.list_rows = np.empty(0, dtype=np.int64)
+            self.list_vectors = embeddings.reshape(0, self.centroids.shape[1])
+            self.n_lists = 1
+            return
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(n_vectors)))
+        n_lists = max(1, min(n_lists, n_vectors))
+
+        rng = np.random.default_rng(seed)
+        self.centroids = _kmeans(embeddings, n_lists, n_iter, rng)
+        assignments = _nearest_centroids(embeddings, self.centroids)
+
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=n_lists)
+        self.list_offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.list_rows = order
+        self.list_vectors = embeddings[order]
+        self.n_lists = n_lists
+
+    def search(self, query: np.ndarray, k: int, n_probe: int = ANN_NUM_PROBES, exclude: np.ndarray = None) -> np.ndarray:
+        """Return the rows of the approximate top k vectors for a query, best first, skipping excluded rows."""
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = max(1, min(n_probe, self.n_lists))
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        positions = np.concatenate([
+            np.arange(self.list_offsets[probe], self.list_offsets[probe + 1]) for probe in probes
+        ])
+        if exclude is not None and len(exclude):
+            positions = positions[~np.isin(self.list_rows[positions], exclude)]
+        k = min(k, len(positions))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        scores = self.list_vectors[positions] @ query
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return self.list_rows[positions[ranked]]
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Assign every vector to its closest centroid by squared L2 distance."""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        distances = centroid_norms - 2.0 * (chunk @ centroids.T)
+        assignments[start:start + chunk_size] = np.argmin(distances, axis=1)
+    return assignments
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int, rng, max_samples_per_cluster: int = 256) -> np.ndarray:
+    """Lloyd's k-means on a bounded sample of the vectors."""
+    sample_size = min(len(vectors), n_clusters * max_samples_per_cluster)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+
+    return centroids
@@ -0,0 +1,108 @@
+import threading
+import time
+from data_ingestion.catalog import changed_documents, advance_watermark
+from model_serving.embedding_index import catalog_signature
+from utils.config import INGEST_UPDATED_FIELD, CATALOG_REFRESH_INTERVAL, CATALOG_FULL_REFRESH_INTERVAL
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+class Catalog:
+    """Immutable view of the video catalog at one point in time."""
+
+    def __init__(self, video_ids, version):
+        self.video_ids = tuple(video_ids)
+        self.version = version
+        self.signature = catalog_signature(self.video_ids)
+
+class CatalogSnapshot:
+    """Video catalog held in memory and refreshed by a background thread.
+
+    Each refresh polls for videos updated since the last watermark and builds a new
+    Catalog, which replaces the old one in a single reference assignment, so requests
+    never wait on Firestore. A full reload every full_refresh_interval picks up
+    deleted videos and videos without an updatedAt, which delta polling cannot see;
+    it keeps the existing order, so an unchanged catalog keeps its signature.
+
+    warm, if given, is called with every new Catalog before it is swapped in, so the
+    refresh thread rather than the next request pays for building its indexes.
+    """
+
+    def __init__(self, db, refresh_interval=CATALOG_REFRESH_INTERVAL, full_refresh_interval=CATALOG_FULL_REFRESH_INTERVAL, warm=None):
+        self._db = db
+        self._warm = warm
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._catalog = Catalog((), 0)
+        self._watermark = None
+        self._last_full_refresh = None
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def current(self) -> Catalog:
+        return self._catalog
+
+    def refresh(self, full=False):
+        """Poll Firestore once and swap in a new catalog if it changed. Returns True on change."""
+        with self._refresh_lock:
+            now = time.monotonic()
+            full = full or self._last_full_refresh is None or now - self._last_full_refresh >= self.full_refresh_interval
+            catalog = self._catalog
+            videos_ref = self._db.collection('videos')
+
+            watermark = None if full else self._watermark
+            known = set(catalog.video_ids)
+            seen = set()
+            added = []
+            undated = 0
+            for video in changed_documents(videos_ref, INGEST_UPDATED_FIELD, watermark):
+                updated_at = video.to_dict().get(INGEST_UPDATED_FIELD)
+                if updated_at is None:
+                    undated += 1
+                watermark = advance_watermark(watermark, updated_at)
+                seen.add(video.id)
+                if video.id not in known:
+                    known.add(video.id)
+                    added.append(video.id)
+
+            if full:
+                video_ids = [video_id for video_id in catalog.video_ids if video_id in seen] + added
+                if undated:
+                    logger.warning(f"{undated} videos have no {INGEST_UPDATED_FIELD}; only full refreshes pick up their changes.")
+            else:
+                video_ids = list(catalog.video_ids) + added
+
+            self._watermark = watermark
+            if full:
+                self._last_full_refresh = now
+            if tuple(video_ids) == catalog.video_ids:
+                return False
+            new_catalog = Catalog(video_ids, catalog.version + 1)
+            if self._warm is not None:
+                try:
+                    self._warm(new_catalog)
+                except Exception as e:
+                    logger.error(f"Warming catalog v{new_catalog.version} failed: {e}")
+            self._catalog = new_catalog
+            logger.info(f"Catalog snapshot v{self._catalog.version} holds {len(video_ids)} videos.")
+            return True
+
+    def start(self):
+        """Load the catalog once, then keep refreshing it in a daemon thread."""
+        try:
+            self.refresh(full=True)
+        except Exception as e:
+            logger.error(f"Initial catalog load failed: {e}")
+
+        def refresh_loop():
+            while True:
+                time.sleep(self.refresh_interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Catalog refresh failed: {e}")
+
+        self._thread = threading.Thread(target=refresh_loop, name="CatalogRefresh")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
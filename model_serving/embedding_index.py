@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import numpy as np
+from model_serving.ann_index import IVFIndex
+from utils.config import BATCH_SIZE
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+class VideoEmbeddingIndex:
+    """Contiguous video embedding matrix with an id <-> row mapping."""
+
+    def __init__(self, video_ids: list, embeddings: np.ndarray, version: tuple):
+        self.video_ids = list(video_ids)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.id_to_row = {video_id: row for row, video_id in enumerate(self.video_ids)}
+        self.version = version
+        self._ann = None
+        self._ann_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def scores(self, user_embedding: np.ndarray) -> np.ndarray:
+        """Score every video in the index against a single user embedding."""
+        return self.embeddings @ np.asarray(user_embedding, dtype=np.float32)
+
+    def ann_index(self) -> IVFIndex:
+        """Build the approximate index on first use and reuse it afterwards."""
+        with self._ann_lock:
+            if self._ann is None:
+                self._ann = IVFIndex(self.embeddings)
+                logger.info(f"Built IVF index with {self._ann.n_lists} lists over {len(self)} videos.")
+            return self._ann
+
+    def rows_for(self, video_ids) -> np.ndarray:
+        """Map video ids to their embedding rows, skipping ids that are not in the index."""
+        id_to_row = self.id_to_row
+        return np.fromiter((id_to_row[video_id] for video_id in video_ids if video_id in id_to_row), dtype=np.int64)
+
+    def _ranked_ids(self, scores: np.ndarray, rows: np.ndarray) -> list:
+        # Excluded rows score -inf; drop any that were still needed to fill k.
+        return [self.video_ids[row] for row in rows if scores[row] != -np.inf]
+
+    def top_k(self, user_embedding: np.ndarray, k: int, use_ann: bool = False, exclude: np.ndarray = None) -> list:
+        """Return the ids of the k highest scoring videos, best first, never returning excluded rows."""
+        if not self.video_ids:
+            # An empty catalog may come with a (0, 0) matrix that can't be multiplied by a query.
+            return []
+        if use_ann:
+            rows = self.ann_index().search(user_embedding, k, exclude=exclude)
+            return [self.video_ids[row] for row in rows]
+        scores = self.scores(user_embedding)
+        if exclude is not None and len(exclude):
+            scores[exclude] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return self._ranked_ids(scores, ranked)
+
+    def top_k_batch(self, user_embeddings: np.ndarray, k: int, use_ann: bool = False, excludes: list = None) -> list:
+        """Return the top k video ids for every row of a user embedding matrix.
+
+        excludes, if given, holds one array of embedding rows per user to mask out of that user's scores.
+        """
+        user_embeddings = np.asarray(user_embeddings, dtype=np.float32)
+        if not self.video_ids:
+            return [[] for _ in range(len(user_embeddings))]
+        if excludes is None:
+            excludes = [None] * len(user_embeddings)
+        if use_ann:
+            return [
+                self.top_k(user_embedding, k, use_ann=True, exclude=exclude)
+                for user_embedding, exclude in zip(user_embeddings, excludes)
+            ]
+        scores = user_embeddings @ self.embeddings.T
+        lengths = [0 if exclude is None else len(exclude) for exclude in excludes]
+        if any(lengths):
+            users = np.repeat(np.arange(len(user_embeddings)), lengths)
+            rows = np.concatenate([exclude for exclude in excludes if exclude is not None and len(exclude)])
+            scores[users, rows] = -np.inf
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(user_embeddings))]
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+        ranked = np.take_along_axis(candidates, order, axis=1)
+        return [self._ranked_ids(user_scores, rows) for user_scores, rows in zip(scores, ranked)]
+
+def catalog_signature(video_ids: list) -> str:
+    """Stable fingerprint of an ordered video id list."""
+    digest = hashlib.sha1()
+    for video_id in video_ids:
+        digest.update(video_id.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def build_video_index(model, video_ids: list, batch_size: int = BATCH_SIZE, signature: str = None) -> VideoEmbeddingIndex:
+    """Run the video tower once over the catalog and pack the result into an index."""
+    if signature is None:
+        signature = catalog_signature(video_ids)
+    version = (getattr(model, 'version', None), signature)
+    chunks = []
+    for start in range(0, len(video_ids), batch_size):
+        chunk = np.array(video_ids[start:start + batch_size])
+        chunks.append(np.asarray(model.video_model(chunk), dtype=np.float32))
+    if chunks:
+        embeddings = np.concatenate(chunks, axis=0)
+    else:
+        embeddings = np.zeros((0, 0), dtype=np.float32)
+    logger.info(f"Built video embedding index with {len(video_ids)} videos for model version {version[0]}.")
+    return VideoEmbeddingIndex(video_ids, embeddings, version)
+
+_index_lock = threading.Lock()
+_indexes = {}
+_MAX_INDEXES = 4
+
+def get_video_index(model, video_ids: list, signature: str = None) -> VideoEmbeddingIndex:
+    """Return the index for this model and catalog, rebuilding it only when either changes.
+
+    Callers that already know the catalog's signature can pass it to skip rehashing the ids.
+    """
+    if signature is None:
+        signature = catalog_signature(video_ids)
+    version = (getattr(model, 'version', None), signature)
+    with _index_lock:
+        index = _indexes.get(id(model))
+        if index is None or index.version != version:
+            index = build_video_index(model, video_ids, signature=signature)
+            _indexes.pop(id(model), None)
+            _indexes[id(model)] = index
+            while len(_indexes) > _MAX_INDEXES:
+                _indexes.pop(next(iter(_indexes)))
+        return index
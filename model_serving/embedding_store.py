@@ -0,0 +1,169 @@
+import os
+import threading
+import uuid
+import numpy as np
+from model_serving.embedding_index import VideoEmbeddingIndex, catalog_signature
+from model_serving.model_registry import ModelHandle
+from utils.config import BATCH_SIZE
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Exported next to the SavedModels of every registry version. Row 0 of each table is
+# the OOV embedding; row i + 1 belongs to line i of the matching id file.
+USER_EMBEDDINGS_FILE = 'user_embeddings.npy'
+USER_IDS_FILE = 'user_ids.txt'
+VIDEO_EMBEDDINGS_FILE = 'video_embeddings.npy'
+VIDEO_IDS_FILE = 'video_ids.txt'
+
+# Never a real id, so the towers map it to their OOV row.
+_OOV_PROBE = '\0'
+
+def _tower_table(tower, ids, batch_size):
+    chunks = [np.asarray(tower(np.array([_OOV_PROBE])), dtype=np.float32)]
+    for start in range(0, len(ids), batch_size):
+        chunks.append(np.asarray(tower(np.array(ids[start:start + batch_size])), dtype=np.float32))
+    return np.concatenate(chunks, axis=0)
+
+# Written to a temporary name unique to this writer and renamed, since a migration
+# may export into a version directory that other processes poll or migrate too.
+def _temp_path(path):
+    return f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+
+def _write_ids(path, ids):
+    temp_path = _temp_path(path)
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(ids))
+    os.replace(temp_path, path)
+
+def _write_table(path, table):
+    temp_path = _temp_path(path)
+    with open(temp_path, 'wb') as file:
+        np.save(file, table)
+    os.replace(temp_path, path)
+
+def _read_ids(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    return content.split('\n') if content else []
+
+def export_embeddings(export_dir, user_model, user_ids, video_model, video_ids, batch_size=BATCH_SIZE):
+    """Run both towers over their vocabularies and save the tables with aligned id files."""
+    _write_table(os.path.join(export_dir, USER_EMBEDDINGS_FILE), _tower_table(user_model, list(user_ids), batch_size))
+    _write_ids(os.path.join(export_dir, USER_IDS_FILE), user_ids)
+    _write_table(os.path.join(export_dir, VIDEO_EMBEDDINGS_FILE), _tower_table(video_model, list(video_ids), batch_size))
+    _write_ids(os.path.join(export_dir, VIDEO_IDS_FILE), video_ids)
+    logger.info(f"Exported embeddings for {len(user_ids)} users and {len(video_ids)} videos to {export_dir}.")
+
+def export_saved_model_embeddings(model_dir):
+    """Export the tables of a model saved before exports existed, from its SavedModel towers.
+
+    Each tower's vocabulary is read back from its StringLookup layer. Returns True on success.
+    """
+    try:
+        # Imported here so processes serving exported versions never load TensorFlow.
+        import tensorflow as tf
+        towers = []
+        for name in ('user_model', 'video_model'):
+            tower = tf.keras.models.load_model(os.path.join(model_dir, name), compile=False)
+            lookup = next(layer for layer in tower.layers if isinstance(layer, tf.keras.layers.StringLookup))
+            # Index 0 of the vocabulary is the OOV token.
+            towers.append((tower, lookup.get_vocabulary()[1:]))
+        export_embeddings(model_dir, towers[0][0], towers[0][1], towers[1][0], towers[1][1])
+        return True
+    except Exception as e:
+        logger.error(f"Could not export embeddings from the SavedModels in {model_dir}: {e}")
+        return False
+
+def has_embeddings(model_dir):
+    return all(
+        os.path.exists(os.path.join(model_dir, name))
+        for name in (USER_EMBEDDINGS_FILE, USER_IDS_FILE, VIDEO_EMBEDDINGS_FILE, VIDEO_IDS_FILE)
+    )
+
+class EmbeddingStore:
+    """Read-only, memory-mapped user and video embedding tables with NumPy scoring.
+
+    Every process mapping the same version shares one page-cache copy of the tables,
+    and opening a store only reads the id files, so no TensorFlow runtime is needed.
+    """
+
+    _MAX_INDEXES = 4
+
+    def __init__(self, model_dir, version=None):
+        self.version = version
+        self.user_rows = {user_id: row + 1 for row, user_id in enumerate(_read_ids(os.path.join(model_dir, USER_IDS_FILE)))}
+        self.video_rows = {video_id: row + 1 for row, video_id in enumerate(_read_ids(os.path.join(model_dir, VIDEO_IDS_FILE)))}
+        self.user_embeddings = np.load(os.path.join(model_dir, USER_EMBEDDINGS_FILE), mmap_mode='r')
+        self.video_embeddings = np.load(os.path.join(model_dir, VIDEO_EMBEDDINGS_FILE), mmap_mode='r')
+        self.trained_user_ids = self.user_rows
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, model_dir, version=None):
+        """Open the store exported with a model version, exporting it first for older models.
+
+        Returns None if there are no tables and they cannot be exported.
+        """
+        if not has_embeddings(model_dir):
+            if not all(os.path.exists(os.path.join(model_dir, name, 'saved_model.pb')) for name in ('user_model', 'video_model')):
+                logger.warning(f"No model in {model_dir}. Please train the model first.")
+                return None
+            logger.warning(f"No exported embeddings in {model_dir}. Exporting them from the SavedModels.")
+            if not export_saved_model_embeddings(model_dir):
+                return None
+        return cls(model_dir, version)
+
+    def user_vectors(self, user_ids) -> np.ndarray:
+        """Embeddings for the given users; unknown users get the OOV row, as in the user tower."""
+        rows = np.fromiter((self.user_rows.get(user_id, 0) for user_id in user_ids), dtype=np.int64)
+        return np.asarray(self.user_embeddings[rows], dtype=np.float32)
+
+    def video_index(self, video_ids, signature=None) -> VideoEmbeddingIndex:
+        """Index over the catalog, viewing the mapped table directly when the catalog matches the export."""
+        if signature is None:
+            signature = catalog_signature(video_ids)
+        with self._index_lock:
+            index = self._indexes.get(signature)
+            if index is None:
+                rows = np.fromiter((self.video_rows.get(video_id, 0) for video_id in video_ids), dtype=np.int64)
+                if len(rows) == len(self.video_rows) and np.array_equal(rows, np.arange(1, len(rows) + 1)):
+                    embeddings = self.video_embeddings[1:]
+                else:
+                    embeddings = self.video_embeddings[rows]
+                index = VideoEmbeddingIndex(video_ids, embeddings, (self.version, signature))
+                self._indexes[signature] = index
+                while len(self._indexes) > self._MAX_INDEXES:
+                    self._indexes.pop(next(iter(self._indexes)))
+            return index
+
+    def recommend(self, user_id, video_ids, top_k=10, use_ann=False, signature=None, exclude_ids=None):
+        """NumPy counterpart of inference.recommend."""
+        index = self.video_index(video_ids, signature)
+        exclude = index.rows_for(exclude_ids) if exclude_ids else None
+        return index.top_k(self.user_vectors([user_id])[0], top_k, use_ann=use_ann, exclude=exclude)
+
+    def recommend_batch(self, user_ids, video_ids, top_k=10, chunk_size=BATCH_SIZE, use_ann=False, signature=None, exclude_ids=None):
+        """NumPy counterpart of inference.recommend_batch."""
+        index = self.video_index(video_ids, signature)
+        recommendations = []
+        for start in range(0, len(user_ids), chunk_size):
+            excludes = None
+            if exclude_ids is not None:
+                excludes = [index.rows_for(ids) if ids else None for ids in exclude_ids[start:start + chunk_size]]
+            recommendations.extend(index.top_k_batch(
+                self.user_vectors(user_ids[start:start + chunk_size]), top_k, use_ann=use_ann, excludes=excludes
+            ))
+        return recommendations
+
+_handle_lock = threading.Lock()
+_store_handle = None
+
+def get_store_handle() -> ModelHandle:
+    """Return this process's handle on the current version's embedding store."""
+    global _store_handle
+    with _handle_lock:
+        if _store_handle is None:
+            _store_handle = ModelHandle(EmbeddingStore.load).start()
+        return _store_handle
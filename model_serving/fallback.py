@@ -0,0 +1,85 @@
+from itertools import chain
+from collections import Counter
+from cache_management.cache_utils import set_many, get_many, replace_hash, update_hash, hash_get_many
+from data_ingestion.ingest_state import load_user_interests
+from utils.config import FALLBACK_LIST_SIZE
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Cold-start lists, written by the training and ingest jobs and read without any
+# model inference: a global popularity ranking, one ranking per KMeans cluster of
+# interaction stats, a hash from user id to the cluster most of that user's
+# interactions fall into, and a hash from profile interest to the cluster its users
+# are most concentrated in. Cold users have no interactions in the trained shards, so
+# they are placed through their interests; without any, they get popularity alone.
+POPULAR_KEY = 'fallback:popular'
+CLUSTER_LISTS_KEY = 'fallback:clusters'
+USER_CLUSTERS_KEY = 'fallback:user_clusters'
+INTEREST_CLUSTERS_KEY = 'fallback:interest_clusters'
+
+# Refreshed by their jobs rather than expired.
+FALLBACK_EXPIRATION = 30 * 24 * 3600
+
+def store_popular(video_ids):
+    """Replace the global popularity list."""
+    set_many({POPULAR_KEY: list(video_ids)[:FALLBACK_LIST_SIZE]}, FALLBACK_EXPIRATION)
+    logger.info(f"Stored popularity fallback list with {min(len(video_ids), FALLBACK_LIST_SIZE)} videos.")
+
+def store_cluster_fallbacks(cluster_lists, user_clusters, interest_clusters):
+    """Replace the per-cluster lists and the user -> cluster and interest -> cluster assignments."""
+    set_many({CLUSTER_LISTS_KEY: [list(videos)[:FALLBACK_LIST_SIZE] for videos in cluster_lists]}, FALLBACK_EXPIRATION)
+    replace_hash(USER_CLUSTERS_KEY, user_clusters)
+    replace_hash(INTEREST_CLUSTERS_KEY, interest_clusters)
+    logger.info(f"Stored {len(cluster_lists)} cluster fallback lists for {len(user_clusters)} users.")
+
+def store_user_clusters(user_clusters):
+    """Add or update user -> cluster assignments, keeping everyone else's."""
+    update_hash(USER_CLUSTERS_KEY, user_clusters)
+    logger.info(f"Stored cluster assignments for {len(user_clusters)} users.")
+
+def _interest_clusters(user_ids, clusters):
+    """Fill in a cluster for users without one by majority vote over their profile interests."""
+    missing = [user_id for user_id, cluster in zip(user_ids, clusters) if cluster is None]
+    if not missing:
+        return clusters
+    interests = load_user_interests(missing)
+    all_interests = list(dict.fromkeys(interest for user_id in missing for interest in interests[user_id]))
+    by_interest = dict(zip(all_interests, hash_get_many(INTEREST_CLUSTERS_KEY, all_interests)))
+    voted = {}
+    for user_id in missing:
+        votes = Counter(int(by_interest[interest]) for interest in interests[user_id] if by_interest[interest] is not None)
+        if votes:
+            voted[user_id] = votes.most_common(1)[0][0]
+    return [voted.get(user_id) if cluster is None else cluster for user_id, cluster in zip(user_ids, clusters)]
+
+def fallback_recommendations(user_ids, top_k=10, exclude_ids=None):
+    """Recommend from the user's cluster list, topped up from the popularity list.
+
+    Users with no trained interactions are placed in a cluster by their mirrored profile
+    interests; users with neither get the popularity list alone. exclude_ids, if given,
+    holds one set of video ids per user that must not be returned.
+    """
+    user_ids = list(user_ids)
+    if exclude_ids is None:
+        exclude_ids = [set()] * len(user_ids)
+    stored = get_many([POPULAR_KEY, CLUSTER_LISTS_KEY])
+    popular = stored.get(POPULAR_KEY) or []
+    cluster_lists = stored.get(CLUSTER_LISTS_KEY) or []
+
+    clusters = [int(cluster) if cluster is not None else None for cluster in hash_get_many(USER_CLUSTERS_KEY, user_ids)]
+    clusters = _interest_clusters(user_ids, clusters)
+
+    recommendations = []
+    for cluster, excluded in zip(clusters, exclude_ids):
+        cluster_list = cluster_lists[cluster] if cluster is not None and cluster < len(cluster_lists) else []
+        videos = []
+        seen = set(excluded)
+        for video_id in chain(cluster_list, popular):
+            if video_id not in seen:
+                seen.add(video_id)
+                videos.append(video_id)
+                if len(videos) == top_k:
+                    break
+        recommendations.append(videos)
+    return recommendations
@@ -3,9 +3,11 @@ import tensorflow_recommenders as tfrs
 import numpy as np
 import os
 import threading
-from utils.config import MODEL_DIR
+from utils.config import BATCH_SIZE
 from firebase_init import db  
 from utils.logger import setup_logger
+from model_serving.embedding_index import get_video_index
+from model_serving.model_registry import current_model_dir
 
 logger = setup_logger()
 
@@ -21,27 +23,55 @@ class MyModel(tfrs.Model):
         video_embeddings = self.video_model(features["video_id"])
         return self.task(user_embeddings, video_embeddings)
 
-def load_model(model_dir: str) -> MyModel:
-    """Load the existing model from the specified directory."""
+def model_version(model_dir: str) -> str:
+    """Identify a saved model by the modification times of its towers."""
+    mtimes = [
+        os.path.getmtime(os.path.join(model_dir, tower, 'saved_model.pb'))
+        for tower in ('user_model', 'video_model')
+    ]
+    return f"{max(mtimes):.6f}"
+
+def load_model(model_dir: str, version: str = None) -> MyModel:
+    """Load the existing model from the specified directory.
+
+    version names a registry version; models outside the registry are identified by their mtimes.
+    """
     try:
         user_model = tf.saved_model.load(os.path.join(model_dir, 'user_model'))
         video_model = tf.saved_model.load(os.path.join(model_dir, 'video_model'))
         task = tfrs.tasks.Retrieval(metrics=tfrs.metrics.FactorizedTopK(candidates=video_model))
-        return MyModel(user_model, video_model, task)
+        model = MyModel(user_model, video_model, task)
+        model.version = version or model_version(model_dir)
+        return model
     except OSError as e:
         logger.warning(f"Model files not found in {model_dir}. Please train the model first.")
         return None
 
-def recommend(user_id: str, model: MyModel, video_ids: list, top_k: int = 10):
-    """Generate recommendations for a given user."""
-    user_embedding = model.user_model(np.array([user_id]))
-    video_embeddings = model.video_model(np.array(video_ids))
+def recommend(user_id: str, model: MyModel, video_ids: list, top_k: int = 10, use_ann: bool = False, signature: str = None, exclude_ids=None):
+    """Generate recommendations for a given user, optionally through the approximate index.
+
+    Videos in exclude_ids (e.g. the user's watch history) are masked out inside the top-k selection.
+    """
+    index = get_video_index(model, video_ids, signature)
+    user_embedding = np.asarray(model.user_model(np.array([user_id])), dtype=np.float32)[0]
+    exclude = index.rows_for(exclude_ids) if exclude_ids else None
+    return index.top_k(user_embedding, top_k, use_ann=use_ann, exclude=exclude)
 
-    scores = tf.linalg.matmul(user_embedding, video_embeddings, transpose_b=True)
-    top_k_indices = tf.math.top_k(scores, k=top_k).indices.numpy().flatten()
+def recommend_batch(user_ids: list, model: MyModel, video_ids: list, top_k: int = 10, chunk_size: int = BATCH_SIZE, use_ann: bool = False, signature: str = None, exclude_ids: list = None):
+    """Generate recommendations for many users, one user-tower pass and matmul per chunk.
 
-    recommended_video_ids = [video_ids[i] for i in top_k_indices]
-    return recommended_video_ids
+    exclude_ids, if given, holds one collection of video ids per user to mask out of that user's results.
+    """
+    index = get_video_index(model, video_ids, signature)
+    recommendations = []
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = np.array(user_ids[start:start + chunk_size])
+        user_embeddings = np.asarray(model.user_model(chunk), dtype=np.float32)
+        excludes = None
+        if exclude_ids is not None:
+            excludes = [index.rows_for(ids) if ids else None for ids in exclude_ids[start:start + chunk_size]]
+        recommendations.extend(index.top_k_batch(user_embeddings, top_k, use_ann=use_ann, excludes=excludes))
+    return recommendations
 
 data_lock = threading.Lock()
 
@@ -58,7 +88,7 @@ def fetch_user_and_video_ids():
 
 
 if __name__ == "__main__":
-    model = load_model(MODEL_DIR)
+    model = load_model(current_model_dir())
 
     user_ids, video_ids = fetch_user_and_video_ids()
 
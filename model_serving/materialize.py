@@ -0,0 +1,68 @@
+from cache_management.cache_utils import store_many, get_many
+from model_serving.embedding_index import catalog_signature
+from utils.config import BATCH_SIZE, MATERIALIZED_TOP_K, MATERIALIZED_EXPIRATION
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+def recommendations_key(user_id, version):
+    # Keys are scoped to the model version, so a new version never overwrites a list
+    # another process may have cached; the previous version's lists simply expire.
+    return f"recs:{version}:{user_id}"
+
+def materialize_recommendations(model, user_ids, video_ids, top_k=MATERIALIZED_TOP_K, chunk_size=BATCH_SIZE, signature=None):
+    """Score every user against the catalog and store each top-k list in Redis under the model version.
+
+    model is an EmbeddingStore. Lists are written one pipeline per chunk, straight to
+    Redis, so memory stays bounded by chunk_size users.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    version = getattr(model, 'version', None)
+    if signature is None:
+        signature = catalog_signature(video_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        recommendations = model.recommend_batch(chunk, video_ids, top_k, chunk_size, signature=signature)
+        store_many(
+            {recommendations_key(user_id, version): videos for user_id, videos in zip(chunk, recommendations)},
+            MATERIALIZED_EXPIRATION
+        )
+    logger.info(f"Materialized top-{top_k} recommendations for {len(user_ids)} users at model version {version}.")
+    return len(user_ids)
+
+def get_materialized(user_ids, model_version):
+    """Return {user_id: videos} for users whose stored list was produced by model_version."""
+    stored = get_many([recommendations_key(user_id, model_version) for user_id in user_ids])
+    materialized = {}
+    for user_id in user_ids:
+        videos = stored.get(recommendations_key(user_id, model_version))
+        if videos is not None:
+            materialized[user_id] = videos
+    return materialized
+
+def lookup_or_score(user_ids, model, video_ids, top_k=10, chunk_size=BATCH_SIZE, signature=None, exclude_ids=None):
+    """Serve materialized lists where they exist and score only the remaining users live.
+
+    exclude_ids, if given, holds one set of video ids per user that must not be returned.
+    """
+    user_ids = list(user_ids)
+    if exclude_ids is None:
+        exclude_ids = [set()] * len(user_ids)
+    if signature is None:
+        signature = catalog_signature(video_ids)
+    excluded = dict(zip(user_ids, exclude_ids))
+
+    results = {}
+    for user_id, videos in get_materialized(user_ids, getattr(model, 'version', None)).items():
+        kept = [video_id for video_id in videos if video_id not in excluded[user_id]][:top_k]
+        if len(kept) == top_k or len(videos) >= len(video_ids):
+            results[user_id] = kept
+
+    missing = [user_id for user_id in excluded if user_id not in results]
+    if missing:
+        scored = model.recommend_batch(
+            missing, video_ids, top_k, chunk_size,
+            signature=signature, exclude_ids=[excluded[user_id] for user_id in missing]
+        )
+        results.update(zip(missing, scored))
+    return [list(results[user_id]) for user_id in user_ids]
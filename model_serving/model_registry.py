@@ -0,0 +1,131 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from utils.config import MODEL_DIR, MODEL_VERSIONS_DIR, MODEL_VERSIONS_TO_KEEP, MODEL_STAGING_MAX_AGE, MODEL_POLL_INTERVAL
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Layout under MODEL_DIR:
+#   versions/<version>/{user_model,video_model}   immutable once published
+#   versions/.staging-<id>/                       being written by a trainer
+#   CURRENT                                       name of the live version
+CURRENT_FILE = 'CURRENT'
+STAGING_PREFIX = '.staging-'
+
+def create_staging_dir(versions_dir=MODEL_VERSIONS_DIR):
+    """Return a fresh directory for a trainer to save a model into before publishing it."""
+    staging_dir = os.path.join(versions_dir, f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+    os.makedirs(staging_dir)
+    return staging_dir
+
+def publish_version(staging_dir, model_dir=MODEL_DIR, versions_dir=MODEL_VERSIONS_DIR):
+    """Freeze a staged model as a new version and point CURRENT at it.
+
+    The rename and the pointer swap are each atomic, so readers see either the old
+    or the new version, never a partially written one.
+    """
+    version = time.strftime('%Y%m%dT%H%M%S') + f"-{uuid.uuid4().hex[:8]}"
+    os.rename(staging_dir, os.path.join(versions_dir, version))
+    pointer = os.path.join(model_dir, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w') as file:
+        file.write(version)
+    os.replace(pointer + '.tmp', pointer)
+    logger.info(f"Published model version {version}.")
+    prune_versions(versions_dir, keep=MODEL_VERSIONS_TO_KEEP, current=version)
+    return version
+
+def current_version(model_dir=MODEL_DIR):
+    """Return the live version name, or None before the first publish."""
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE), 'r') as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+def version_dir(version, versions_dir=MODEL_VERSIONS_DIR):
+    return os.path.join(versions_dir, version)
+
+def current_model_dir(model_dir=MODEL_DIR, versions_dir=MODEL_VERSIONS_DIR):
+    """Directory of the live model; models saved before the registry live directly in MODEL_DIR."""
+    version = current_version(model_dir)
+    return version_dir(version, versions_dir) if version else model_dir
+
+def prune_versions(versions_dir=MODEL_VERSIONS_DIR, keep=MODEL_VERSIONS_TO_KEEP, current=None, staging_max_age=MODEL_STAGING_MAX_AGE):
+    """Delete all but the newest keep versions, never the current one, and abandoned staging directories.
+
+    Processes still serving an older version hold its weights in memory, so removing
+    its files does not affect them. A staging directory untouched for staging_max_age
+    seconds belongs to a trainer that failed before publishing.
+    """
+    names = os.listdir(versions_dir)
+    versions = sorted(name for name in names if not name.startswith(STAGING_PREFIX))
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+    now = time.time()
+    for name in names:
+        path = os.path.join(versions_dir, name)
+        if name.startswith(STAGING_PREFIX) and now - os.path.getmtime(path) > staging_max_age:
+            logger.warning(f"Removing abandoned staging directory {path}.")
+            shutil.rmtree(path, ignore_errors=True)
+
+class ModelHandle:
+    """One loaded model per process, swapped to the registry's current version in the background.
+
+    loader(model_dir, version) loads a model and returns it, or None on failure. Requests
+    call get(), which only reads a reference; loading happens on the polling thread.
+    """
+
+    def __init__(self, loader, poll_interval=MODEL_POLL_INTERVAL):
+        self._loader = loader
+        self.poll_interval = poll_interval
+        self._loaded = (None, None)
+        self._reload_lock = threading.Lock()
+        self._thread = None
+
+    def get(self):
+        return self._loaded[1]
+
+    @property
+    def version(self):
+        return self._loaded[0]
+
+    def refresh(self):
+        """Load the current version if it differs from the one held. Returns True on swap."""
+        with self._reload_lock:
+            version = current_version()
+            if version is not None and version == self._loaded[0]:
+                return False
+            if version is None and self._loaded[1] is not None:
+                return False
+            # Load the version just read, not whatever CURRENT points at by now.
+            model = self._loader(version_dir(version) if version else MODEL_DIR, version)
+            if model is None:
+                return False
+            self._loaded = (version, model)
+            logger.info(f"Swapped to model version {version}.")
+            return True
+
+    def start(self):
+        """Load the current model once, then poll for new versions in a daemon thread."""
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Initial model load failed: {e}")
+
+        def poll_loop():
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Model reload failed: {e}")
+
+        self._thread = threading.Thread(target=poll_loop, name="ModelReload")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
@@ -1,29 +1,51 @@
-import threading
 from flask import Flask, request, jsonify
-from model_serving.inference import load_model, recommend, fetch_user_and_video_ids
-from utils.config import MODEL_DIR
+from model_serving.embedding_store import get_store_handle
+from model_serving.catalog_snapshot import CatalogSnapshot
+from model_serving.materialize import get_materialized
+from model_serving.fallback import fallback_recommendations
+from data_ingestion.catalog import watched_video_ids
 from firebase_init import db  
 from firebase_admin import firestore  
+from utils.config import CATALOG_WARM_ANN_INDEX
 
 app = Flask(__name__)
 
 
-model = load_model(MODEL_DIR)
+# Scores with the memory-mapped embedding tables, so this process never loads TensorFlow.
+model_handle = get_store_handle()
 
-data_lock = threading.Lock()
+def warm_catalog(catalog):
+    """Build the new catalog's embedding index (and IVF index, if configured) before it serves requests."""
+    store = model_handle.get()
+    if store is None:
+        return
+    index = store.video_index(catalog.video_ids, catalog.signature)
+    if CATALOG_WARM_ANN_INDEX:
+        index.ann_index()
+
+catalog_snapshot = CatalogSnapshot(db, warm=warm_catalog).start()
+
+def is_cold_start(model, user_id):
+    return bool(model.trained_user_ids) and user_id not in model.trained_user_ids
 
 @app.route('/recommend', methods=['POST'])
 def get_recommendations():
     data = request.json
     user_id = data.get('user_id')
     top_k = data.get('top_k', 10)
+    use_ann = bool(data.get('use_ann', False))
 
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
 
+    # Hold one model for the whole request even if a newer version is swapped in meanwhile.
+    model = model_handle.get()
+    if model is None:
+        return jsonify({"error": "Model not loaded"}), 503
 
-    with data_lock:
-        _, video_ids = fetch_user_and_video_ids()
+
+    catalog = catalog_snapshot.current()
+    video_ids = catalog.video_ids
 
     if not video_ids:
         return jsonify({"error": "No video IDs found in Firebase"}), 400
@@ -33,10 +55,28 @@ def get_recommendations():
     watched_views = user_data.get('watchedViews', [])
 
 
-    watched_video_ids = [view.rstrip('X') for view in watched_views]
-    video_ids = [vid for vid in video_ids if vid not in watched_video_ids]
-
-    recommendations = recommend(user_id, model, video_ids, top_k)
+    watched = watched_video_ids(watched_views)
+
+    recommendations = None
+    if is_cold_start(model, user_id):
+        # No trained embedding: scoring would only rank the catalog against the OOV row.
+        recommendations = fallback_recommendations([user_id], top_k, [watched])[0] or None
+
+    materialized = None
+    if recommendations is None:
+        materialized = get_materialized([user_id], model.version).get(user_id)
+    if materialized is not None and not use_ann:
+        recommendations = [vid for vid in materialized if vid not in watched][:top_k]
+        # Too much of the stored list was already watched; fall through to live scoring.
+        if len(recommendations) < top_k and len(materialized) < len(video_ids):
+            recommendations = None
+
+    if recommendations is None:
+        # Score against the full catalog so the cached embedding index is reused;
+        # watched videos are masked inside the top-k selection.
+        recommendations = model.recommend(
+            user_id, video_ids, top_k, use_ann=use_ann, signature=catalog.signature, exclude_ids=watched
+        )
 
     try:
         algs_ref = user_ref.collection('algs').document('discover')
@@ -0,0 +1,97 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import firestore
+from utils.config import (
+    FIRESTORE_GET_ALL_CHUNK_SIZE, FIRESTORE_BATCH_SIZE, FIRESTORE_WRITE_WORKERS,
+    FIRESTORE_WRITE_RETRIES, FIRESTORE_RETRY_BACKOFF
+)
+from utils.logger import setup_logger
+from data_ingestion.catalog import watched_video_ids
+
+logger = setup_logger()
+
+def discover_ref(db, user_id):
+    return db.collection('UserData').document(user_id).collection('algs').document('discover')
+
+def prefetch_documents(db, refs, chunk_size=FIRESTORE_GET_ALL_CHUNK_SIZE):
+    """Read many documents with batched get_all calls; returns {path: data or None}."""
+    documents = {}
+    for start in range(0, len(refs), chunk_size):
+        for snapshot in db.get_all(refs[start:start + chunk_size]):
+            documents[snapshot.reference.path] = snapshot.to_dict() if snapshot.exists else None
+    return documents
+
+def _commit_with_retry(db, updates, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        try:
+            batch = db.batch()
+            for ref, data in updates:
+                batch.set(ref, data, merge=True)
+            batch.commit()
+            return len(updates)
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error(f"Giving up on a batch of {len(updates)} writes after {attempt + 1} attempts: {e}")
+                return 0
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            logger.warning(f"Batch write failed ({e}), retrying in {delay:.2f}s.")
+            time.sleep(delay)
+
+def commit_documents(db, updates, batch_size=FIRESTORE_BATCH_SIZE, max_workers=FIRESTORE_WRITE_WORKERS,
+                     max_retries=FIRESTORE_WRITE_RETRIES, backoff=FIRESTORE_RETRY_BACKOFF):
+    """Merge-write (ref, data) pairs in batches of at most batch_size, committing up to max_workers at once.
+
+    Failed batches are retried with jittered exponential backoff. Returns one flag per
+    update saying whether it was written.
+    """
+    batches = [updates[i:i + batch_size] for i in range(0, len(updates), batch_size)]
+    if not batches:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        counts = list(pool.map(lambda chunk: _commit_with_retry(db, chunk, max_retries, backoff), batches))
+    # A batch commits atomically, so each one is either fully written or not at all.
+    written = [count > 0 for batch, count in zip(batches, counts) for _ in batch]
+    if not all(written):
+        logger.error(f"Wrote {sum(written)} of {len(updates)} documents.")
+    return written
+
+def write_documents(db, updates, **kwargs):
+    """Merge-write (ref, data) pairs as commit_documents does. Returns the number of documents written."""
+    return sum(commit_documents(db, updates, **kwargs))
+
+def write_back(db, user_ids, recommend_fn):
+    """Push fresh recommendations for user_ids into each user's algs/discover document.
+
+    recommend_fn(user_ids, watched) maps the user ids and one set of watched video ids per user
+    to recommendation lists in the same order. Returns the number of users written.
+
+    The discover lists are changed with ArrayRemove/ArrayUnion transforms rather than
+    read, merged and overwritten, so entries that /recommend or the new-user job add
+    while the batch is being scored are kept. The two transforms commute here, since
+    recommend_fn never returns a watched video.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return 0
+
+    user_refs = [db.collection('UserData').document(user_id) for user_id in user_ids]
+    documents = prefetch_documents(db, user_refs)
+
+    watched = [
+        watched_video_ids((documents.get(user_ref.path) or {}).get('watchedViews', []))
+        for user_ref in user_refs
+    ]
+    recommendations = recommend_fn(user_ids, watched)
+
+    updates = []
+    union_updates = []
+    for user_id, user_watched, user_recommendations in zip(user_ids, watched, recommendations):
+        algs_ref = discover_ref(db, user_id)
+        if user_watched:
+            updates.append((algs_ref, {'vid': firestore.ArrayRemove(sorted(user_watched))}))
+        union_updates.append(len(updates))
+        updates.append((algs_ref, {'vid': firestore.ArrayUnion(list(user_recommendations))}))
+
+    written = commit_documents(db, updates)
+    return sum(written[index] for index in union_updates)
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import numpy as np
+from utils.config import TRAINING_CHECKPOINT_DIR, FULL_RETRAIN_INTERVAL
+
+STATE_FILE = 'state.json'
+
+def _write_vocabulary(path, vocabulary):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(vocabulary))
+
+def _read_vocabulary(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    return content.split('\n') if content else []
+
+TABLE_FILES = ('user_embeddings.npy', 'user_factors.npy', 'video_embeddings.npy', 'video_factors.npy')
+
+def save_checkpoint(user_vocabulary, user_embeddings, user_factors, video_vocabulary, video_embeddings, video_factors,
+                    trained_shards, full_retrain=False, checkpoint_dir=TRAINING_CHECKPOINT_DIR):
+    """Persist the id vocabularies, their embedding and SVD factor tables and which shards they were trained on.
+
+    Row 0 of every table is the StringLookup OOV row; row i + 1 belongs to vocabulary[i].
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    previous = load_checkpoint_state(checkpoint_dir) or {}
+
+    _write_vocabulary(os.path.join(checkpoint_dir, 'user_vocabulary.txt'), user_vocabulary)
+    _write_vocabulary(os.path.join(checkpoint_dir, 'video_vocabulary.txt'), video_vocabulary)
+    np.save(os.path.join(checkpoint_dir, 'user_embeddings.npy'), np.asarray(user_embeddings, dtype=np.float32))
+    np.save(os.path.join(checkpoint_dir, 'video_embeddings.npy'), np.asarray(video_embeddings, dtype=np.float32))
+    np.save(os.path.join(checkpoint_dir, 'user_factors.npy'), np.asarray(user_factors, dtype=np.float32))
+    np.save(os.path.join(checkpoint_dir, 'video_factors.npy'), np.asarray(video_factors, dtype=np.float32))
+
+    now = time.time()
+    state = {
+        "trained_shards": list(trained_shards),
+        "last_full_retrain": now if full_retrain else previous.get("last_full_retrain", now),
+        "last_update": now,
+        "full_retrain_requested": False if full_retrain else previous.get("full_retrain_requested", False)
+    }
+    _write_state(checkpoint_dir, state)
+
+def _write_state(checkpoint_dir, state):
+    state_path = os.path.join(checkpoint_dir, STATE_FILE)
+    with open(state_path + '.tmp', 'w') as file:
+        json.dump(state, file)
+    os.replace(state_path + '.tmp', state_path)
+
+def request_full_retrain(checkpoint_dir=TRAINING_CHECKPOINT_DIR):
+    """Make the next training run a full retrain, e.g. after a resync rewrote the history."""
+    state = load_checkpoint_state(checkpoint_dir)
+    if state is not None:
+        state["full_retrain_requested"] = True
+        _write_state(checkpoint_dir, state)
+
+def load_checkpoint_state(checkpoint_dir=TRAINING_CHECKPOINT_DIR):
+    """Return the checkpoint's training state, or None if there is no checkpoint."""
+    try:
+        with open(os.path.join(checkpoint_dir, STATE_FILE), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def load_checkpoint(checkpoint_dir=TRAINING_CHECKPOINT_DIR):
+    """Return the full checkpoint (state, vocabularies and tables), or None if there is none.
+
+    Checkpoints written before the towers carried SVD factors count as missing.
+    """
+    state = load_checkpoint_state(checkpoint_dir)
+    if state is None or not _has_tables(checkpoint_dir):
+        return None
+    checkpoint = dict(state)
+    checkpoint["user_vocabulary"] = _read_vocabulary(os.path.join(checkpoint_dir, 'user_vocabulary.txt'))
+    checkpoint["video_vocabulary"] = _read_vocabulary(os.path.join(checkpoint_dir, 'video_vocabulary.txt'))
+    checkpoint["user_embeddings"] = np.load(os.path.join(checkpoint_dir, 'user_embeddings.npy'))
+    checkpoint["video_embeddings"] = np.load(os.path.join(checkpoint_dir, 'video_embeddings.npy'))
+    checkpoint["user_factors"] = np.load(os.path.join(checkpoint_dir, 'user_factors.npy'))
+    checkpoint["video_factors"] = np.load(os.path.join(checkpoint_dir, 'video_factors.npy'))
+    return checkpoint
+
+def _has_tables(checkpoint_dir):
+    return all(os.path.exists(os.path.join(checkpoint_dir, name)) for name in TABLE_FILES)
+
+def save_centroids(centroids, checkpoint_dir=TRAINING_CHECKPOINT_DIR):
+    """Persist the cluster centroids of the last full retrain, so updates can assign users to them."""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    np.save(os.path.join(checkpoint_dir, 'cluster_centroids.npy'), np.asarray(centroids, dtype=np.float32))
+
+def load_centroids(checkpoint_dir=TRAINING_CHECKPOINT_DIR):
+    """Return the saved cluster centroids, or None if no full retrain has saved them."""
+    try:
+        return np.load(os.path.join(checkpoint_dir, 'cluster_centroids.npy'))
+    except OSError:
+        return None
+
+def needs_full_retrain(checkpoint_dir=TRAINING_CHECKPOINT_DIR, interval=FULL_RETRAIN_INTERVAL):
+    """A full retrain is due when there is no checkpoint, one was requested, or the last one is older than interval seconds."""
+    state = load_checkpoint_state(checkpoint_dir)
+    if state is None or state.get("full_retrain_requested") or not _has_tables(checkpoint_dir):
+        return True
+    return time.time() - state.get("last_full_retrain", 0) >= interval
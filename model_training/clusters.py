@@ -0,0 +1,56 @@
+import numpy as np
+from collections import Counter, defaultdict
+from utils.config import FALLBACK_LIST_SIZE
+from model_training.input_pipeline import make_dataset
+
+# Clusters segment interaction records by these engagement stats, not users by their
+# profile: a user's cluster is the one most of their records fall into. Users without
+# interaction records are placed through the profile interests mapped to clusters.
+CLUSTER_FEATURES = ["retention", "views", "impressions", "likes", "comments_count"]
+
+def nearest_cluster(features, centroids):
+    distances = ((features[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=-1)
+    return np.argmin(distances, axis=1)
+
+def _cluster_batches(shard_paths, centroids):
+    columns = ["user_id", "video_id", "interests"] + CLUSTER_FEATURES
+    for batch in make_dataset(shard_paths, columns=columns).as_numpy_iterator():
+        features = np.column_stack([batch[name] for name in CLUSTER_FEATURES]).astype(np.float32)
+        yield from zip(batch["user_id"], batch["video_id"], batch["interests"].to_list(), nearest_cluster(features, centroids))
+
+def build_cluster_lists(shard_paths, centroids, list_size=FALLBACK_LIST_SIZE):
+    """Rank videos within each cluster by how many of its records touch them, and give every user their majority cluster.
+
+    Also maps every profile interest to the cluster whose users carry it most often
+    relative to the cluster's size, so users without interactions can be given a
+    cluster from their interests. Returns (cluster_lists, user_clusters, interest_clusters).
+    """
+    video_counts = [Counter() for _ in range(len(centroids))]
+    user_cluster_counts = defaultdict(Counter)
+    user_interests = {}
+    for user_id, video_id, interests, cluster in _cluster_batches(shard_paths, centroids):
+        user_id = user_id.decode('utf-8')
+        video_counts[cluster][video_id.decode('utf-8')] += 1
+        user_cluster_counts[user_id][int(cluster)] += 1
+        user_interests.setdefault(user_id, {interest.decode('utf-8') for interest in interests})
+
+    cluster_lists = [[video_id for video_id, _ in counts.most_common(list_size)] for counts in video_counts]
+    user_clusters = {user_id: counts.most_common(1)[0][0] for user_id, counts in user_cluster_counts.items()}
+
+    cluster_sizes = Counter(user_clusters.values())
+    interest_counts = defaultdict(Counter)
+    for user_id, interests in user_interests.items():
+        for interest in interests:
+            interest_counts[interest][user_clusters[user_id]] += 1
+    interest_clusters = {
+        interest: max(counts, key=lambda cluster: counts[cluster] / cluster_sizes[cluster])
+        for interest, counts in interest_counts.items()
+    }
+    return cluster_lists, user_clusters, interest_clusters
+
+def assign_user_clusters(shard_paths, centroids):
+    """Give every user in the shards their majority cluster, without touching the cluster lists."""
+    user_cluster_counts = defaultdict(Counter)
+    for user_id, _, _, cluster in _cluster_batches(shard_paths, centroids):
+        user_cluster_counts[user_id.decode('utf-8')][int(cluster)] += 1
+    return {user_id: counts.most_common(1)[0][0] for user_id, counts in user_cluster_counts.items()}
@@ -0,0 +1,185 @@
+import os
+import glob
+import time
+import shutil
+import zlib
+import tensorflow as tf
+from utils.config import TRAINING_SHARD_DIR, TRAINING_SHARD_SIZE, TRAINING_COMPACTION_MAX_PARTITIONS, BATCH_SIZE
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+AUTOTUNE = tf.data.experimental.AUTOTUNE
+
+SHARD_SUFFIX = '.tfrecord'
+
+FEATURE_SPEC = {
+    "user_id": tf.io.FixedLenFeature([], tf.string),
+    "video_id": tf.io.FixedLenFeature([], tf.string),
+    "interests": tf.io.VarLenFeature(tf.string),
+    "tags": tf.io.VarLenFeature(tf.string),
+    "description": tf.io.FixedLenFeature([], tf.string, default_value=''),
+    "retention": tf.io.FixedLenFeature([], tf.float32, default_value=0.0),
+    "views": tf.io.FixedLenFeature([], tf.int64, default_value=0),
+    "impressions": tf.io.FixedLenFeature([], tf.int64, default_value=0),
+    "likes": tf.io.FixedLenFeature([], tf.int64, default_value=0),
+    "comments_count": tf.io.FixedLenFeature([], tf.int64, default_value=0),
+    "watched_views": tf.io.VarLenFeature(tf.string),
+}
+
+def _bytes_list(values):
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value.encode('utf-8') for value in values]))
+
+def _int64(value):
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=[int(value)]))
+
+def _float(value):
+    return tf.train.Feature(float_list=tf.train.FloatList(value=[float(value)]))
+
+def serialize_record(record):
+    """Encode a preprocessed record as a tf.train.Example."""
+    description = record["description"]
+    if isinstance(description, list):
+        description = " ".join(description)
+    feature = {
+        "user_id": _bytes_list([record["user_id"]]),
+        "video_id": _bytes_list([record["video_id"]]),
+        "interests": _bytes_list(record["interests"]),
+        "tags": _bytes_list(record["tags"]),
+        "description": _bytes_list([description]),
+        "retention": _float(record["retention"]),
+        "views": _int64(record["views"]),
+        "impressions": _int64(record["impressions"]),
+        "likes": _int64(len(record["likes"])),
+        "comments_count": _int64(record["comments_count"]),
+        "watched_views": _bytes_list(record["watched_views"]),
+    }
+    return tf.train.Example(features=tf.train.Features(feature=feature)).SerializeToString()
+
+def write_shards(records, shard_dir=TRAINING_SHARD_DIR, records_per_shard=TRAINING_SHARD_SIZE):
+    """Append records to the training history as new TFRecord shards; returns the shard paths."""
+    os.makedirs(shard_dir, exist_ok=True)
+    prefix = f"interactions-{time.time_ns()}"
+    paths = []
+    for shard, start in enumerate(range(0, len(records), records_per_shard)):
+        path = os.path.join(shard_dir, f"{prefix}-{shard:05d}{SHARD_SUFFIX}")
+        # Write under a temporary name so readers never glob a half-written shard.
+        with tf.io.TFRecordWriter(path + '.tmp') as writer:
+            for record in records[start:start + records_per_shard]:
+                writer.write(serialize_record(record))
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+    logger.info(f"Wrote {len(records)} records to {len(paths)} training shards in {shard_dir}.")
+    return paths
+
+def _keyed_records(shard_paths, batch_size=BATCH_SIZE):
+    """Yield ((user_id, video_id), serialized example) for every record, in shard order."""
+    id_spec = {name: FEATURE_SPEC[name] for name in ("user_id", "video_id")}
+    for serialized in tf.data.TFRecordDataset(list(shard_paths)).batch(batch_size).as_numpy_iterator():
+        ids = tf.io.parse_example(serialized, id_spec)
+        yield from zip(zip(ids["user_id"].numpy(), ids["video_id"].numpy()), serialized)
+
+def _partition(key, n_partitions):
+    return zlib.crc32(key[0] + b'\0' + key[1]) % n_partitions
+
+def compact_shards(shard_dir=TRAINING_SHARD_DIR, records_per_shard=TRAINING_SHARD_SIZE,
+                   max_partitions=TRAINING_COMPACTION_MAX_PARTITIONS):
+    """Rewrite the history keeping only the latest record per (user_id, video_id).
+
+    Every fetch appends shards and a full resync appends the whole history again, so
+    without compaction the directory grows without bound and interactions are
+    counted more than once. Later shards win, matching InteractionMatrixBuilder.
+
+    Records are first hash-partitioned by key into one spill file per input shard (up
+    to max_partitions), then each partition is deduped on its own, so memory holds
+    about one shard's worth of records rather than the whole history. Returns the new
+    shard paths.
+    """
+    old_paths = list_shards(shard_dir)
+    if len(old_paths) <= 1:
+        return old_paths
+
+    # Name the output just after the newest input, so shards appended while compacting
+    # still sort (and win) after it.
+    newest = int(os.path.basename(old_paths[-1]).split('-')[1])
+    prefix = f"interactions-{newest + 1}"
+    spill_dir = os.path.join(shard_dir, f".compact-{prefix}")
+    os.makedirs(spill_dir, exist_ok=True)
+    n_partitions = min(len(old_paths), max_partitions)
+    spill_paths = [os.path.join(spill_dir, f"part-{partition:05d}") for partition in range(n_partitions)]
+
+    n_records = 0
+    writers = [tf.io.TFRecordWriter(path) for path in spill_paths]
+    try:
+        for key, serialized in _keyed_records(old_paths):
+            writers[_partition(key, n_partitions)].write(serialized)
+            n_records += 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    paths = []
+    n_kept = 0
+    writer = None
+    try:
+        for spill_path in spill_paths:
+            # Spill files keep input order, so the last record seen for a key is the latest.
+            latest = {}
+            for key, serialized in _keyed_records([spill_path]):
+                latest[key] = serialized
+            for serialized in latest.values():
+                if writer is None or n_kept % records_per_shard == 0:
+                    if writer is not None:
+                        writer.close()
+                        os.replace(paths[-1] + '.tmp', paths[-1])
+                    paths.append(os.path.join(shard_dir, f"{prefix}-{len(paths):05d}{SHARD_SUFFIX}"))
+                    writer = tf.io.TFRecordWriter(paths[-1] + '.tmp')
+                writer.write(serialized)
+                n_kept += 1
+            del latest
+    finally:
+        if writer is not None:
+            writer.close()
+            os.replace(paths[-1] + '.tmp', paths[-1])
+
+    for path in old_paths:
+        os.remove(path)
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    logger.info(f"Compacted {n_records} records in {len(old_paths)} shards to {n_kept} records in {len(paths)} shards.")
+    return paths
+
+def list_shards(shard_dir=TRAINING_SHARD_DIR):
+    """Return the completed shard paths in write order."""
+    return sorted(glob.glob(os.path.join(shard_dir, f"*{SHARD_SUFFIX}")))
+
+def _parse_batch(serialized, columns):
+    spec = {name: FEATURE_SPEC[name] for name in columns}
+    features = tf.io.parse_example(serialized, spec)
+    for name, value in features.items():
+        if isinstance(value, tf.sparse.SparseTensor):
+            features[name] = tf.RaggedTensor.from_sparse(value)
+    return features
+
+def make_dataset(shard_paths, batch_size=BATCH_SIZE, columns=None, shuffle_buffer=0):
+    """Stream batches of parsed features from TFRecord shards.
+
+    Shards are read with parallel interleave, parsed a whole batch at a time and
+    prefetched, so only a few batches are resident regardless of history size.
+    """
+    columns = list(columns or FEATURE_SPEC)
+    files = tf.data.Dataset.from_tensor_slices(list(shard_paths))
+    if shuffle_buffer:
+        files = files.shuffle(len(shard_paths))
+    dataset = files.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=AUTOTUNE,
+        num_parallel_calls=AUTOTUNE,
+        deterministic=not shuffle_buffer
+    )
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer)
+    return (
+        dataset.batch(batch_size)
+        .map(lambda serialized: _parse_batch(serialized, columns), num_parallel_calls=AUTOTUNE)
+        .prefetch(AUTOTUNE)
+    )
@@ -0,0 +1,52 @@
+import numpy as np
+import scipy.sparse as sp
+
+class InteractionMatrixBuilder:
+    """Accumulates (user, video, value) triplets in batches into a sparse interaction matrix.
+
+    Users and videos get row/column indices in first-seen order. When a (user, video)
+    pair is added more than once the last value wins.
+    """
+
+    def __init__(self):
+        self.user_index = {}
+        self.video_index = {}
+        self._rows = []
+        self._cols = []
+        self._values = []
+
+    def add(self, user_ids, video_ids, values):
+        user_index = self.user_index
+        video_index = self.video_index
+        self._rows.append(np.fromiter((user_index.setdefault(u, len(user_index)) for u in user_ids), dtype=np.int64, count=len(user_ids)))
+        self._cols.append(np.fromiter((video_index.setdefault(v, len(video_index)) for v in video_ids), dtype=np.int64, count=len(video_ids)))
+        self._values.append(np.asarray(values, dtype=np.float32))
+
+    def build(self):
+        """Return the CSR matrix over the unique users and videos seen so far."""
+        shape = (len(self.user_index), len(self.video_index))
+        if not self._rows:
+            return sp.csr_matrix(shape, dtype=np.float32)
+
+        rows = np.concatenate(self._rows)
+        cols = np.concatenate(self._cols)
+        values = np.concatenate(self._values)
+
+        keys = rows * shape[1] + cols
+        _, last_reversed = np.unique(keys[::-1], return_index=True)
+        keep = len(keys) - 1 - last_reversed
+        return sp.csr_matrix((values[keep], (rows[keep], cols[keep])), shape=shape, dtype=np.float32)
+
+def build_interaction_matrix(data, value_field="views"):
+    """Build a sparse user x video interaction matrix from training records.
+
+    Returns the CSR matrix together with the id -> row and id -> column dictionaries
+    over the unique users and videos.
+    """
+    builder = InteractionMatrixBuilder()
+    builder.add(
+        [record["user_id"] for record in data],
+        [record["video_id"] for record in data],
+        [record[value_field] for record in data]
+    )
+    return builder.build(), builder.user_index, builder.video_index
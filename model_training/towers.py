@@ -0,0 +1,33 @@
+import numpy as np
+import tensorflow as tf
+from utils.config import EMBEDDING_DIMENSION
+
+def build_hybrid_tower(vocabulary: list, factors: np.ndarray, embedding_dim: int = EMBEDDING_DIMENSION, embeddings: np.ndarray = None):
+    """Build an id tower whose output is a learned embedding concatenated with fixed SVD factors.
+
+    Both tables have one row per StringLookup index: row 0 is OOV, row i + 1 belongs to
+    vocabulary[i]. The 'embedding' layer is trained (and starts from embeddings when
+    given); the 'svd_factors' layer is frozen, so the collaborative-filtering signal is
+    part of every lookup, at training, export and serving time alike.
+    """
+    ids = tf.keras.Input(shape=(), dtype=tf.string)
+    indices = tf.keras.layers.StringLookup(vocabulary=vocabulary)(ids)
+    learned = tf.keras.layers.Embedding(
+        input_dim=len(vocabulary) + 1,
+        output_dim=embedding_dim if embeddings is None else embeddings.shape[1],
+        embeddings_initializer='uniform' if embeddings is None else tf.keras.initializers.Constant(embeddings),
+        name='embedding'
+    )(indices)
+    fixed = tf.keras.layers.Embedding(
+        input_dim=len(vocabulary) + 1,
+        output_dim=factors.shape[1],
+        embeddings_initializer=tf.keras.initializers.Constant(factors),
+        trainable=False,
+        name='svd_factors'
+    )(indices)
+    return tf.keras.Model(ids, tf.keras.layers.Concatenate()([learned, fixed]))
+
+def with_oov_row(factors: np.ndarray) -> np.ndarray:
+    """Prepend the all-zero OOV row to per-id factors."""
+    factors = np.asarray(factors, dtype=np.float32)
+    return np.concatenate([np.zeros((1, factors.shape[1]), dtype=np.float32), factors], axis=0)
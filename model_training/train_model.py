@@ -2,117 +2,125 @@ import os
 import tensorflow as tf
 import tensorflow_recommenders as tfrs
 from sklearn.decomposition import TruncatedSVD
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
 import numpy as np
 import threading
-from utils.config import MODEL_DIR
+from utils.config import TRAINING_SHARD_DIR, BATCH_SIZE
 from utils.logger import setup_logger
+from model_training.interactions import InteractionMatrixBuilder
+from model_training.input_pipeline import make_dataset, compact_shards, AUTOTUNE
+from model_training.checkpoint import save_checkpoint, save_centroids
+from model_training.clusters import CLUSTER_FEATURES, build_cluster_lists
+from model_training.towers import build_hybrid_tower, with_oov_row
+from model_training.update_model import MyModel
+from model_serving.fallback import store_cluster_fallbacks
+from model_serving.model_registry import create_staging_dir, publish_version
+from model_serving.embedding_store import export_embeddings
 import time
 
 logger = setup_logger()
 
 data_lock = threading.Lock()
 
-def train_model(data):
-    start_time = time.time()
-    logger.info("Starting model training...")
-
-    try:
-        with data_lock:
-            user_ids = [record["user_id"] for record in data]
-            video_ids = [record["video_id"] for record in data]
-            interests = [record["interests"] for record in data]
-            tags = [record["tags"] for record in data]
-            descriptions = [" ".join(record["description"]) for record in data]
-            retention = [record["retention"] for record in data]
-            views = [record["views"] for record in data]
-            impressions = [record["impressions"] for record in data]
-            likes = [len(record["likes"]) for record in data]  
-            comments_count = [record["comments_count"] for record in data]  
-            watched_views = [record["watched_views"] for record in data]  
-
-        logger.info(f"Extracted {len(user_ids)} user_ids, {len(video_ids)} video_ids, and other features for training.")
-
-    
-        user_features = list(zip(retention, views, impressions, likes, comments_count))
-        kmeans = KMeans(n_clusters=5, random_state=0).fit(user_features)
-        user_clusters = kmeans.labels_
-
-        dataset = tf.data.Dataset.from_tensor_slices({
-            "user_id": user_ids,
-            "video_id": video_ids,
-            "interests": interests,
-            "tags": tags,
-            "description": descriptions,
-            "retention": retention,
-            "views": views,
-            "impressions": impressions,
-            "likes": likes,  
-            "comments_count": comments_count, 
-            "watched_views": watched_views,  
-            "user_cluster": user_clusters  
-        }).batch(4096).cache().prefetch(buffer_size=tf.data.experimental.AUTOTUNE)
-
-        user_model = tf.keras.Sequential([
-            tf.keras.layers.StringLookup(vocabulary=user_ids),
-            tf.keras.layers.Embedding(input_dim=len(user_ids), output_dim=64)
-        ])
-
-        video_model = tf.keras.Sequential([
-            tf.keras.layers.StringLookup(vocabulary=video_ids),
-            tf.keras.layers.Embedding(input_dim=len(video_ids), output_dim=64)
-        ])
-
-        logger.info("Defined user and video models.")
-
-        text_embedding_model = tf.keras.Sequential([
-            tf.keras.layers.Input(shape=(), dtype=tf.string),
-            tf.keras.layers.TextVectorization(max_tokens=20000, output_mode='int', output_sequence_length=200),
-            tf.keras.layers.Embedding(input_dim=20000, output_dim=64)
-        ])
-
-        logger.info("Defined text embedding model.")
-
-        retrieval_model = tfrs.models.Model(
-            user_model=user_model,
-            item_model=video_model,
-            task=tfrs.tasks.Retrieval(metrics=tfrs.metrics.FactorizedTopK(candidates=video_ids))
+def _split_shards(shard_paths):
+    """Hold out the last fifth of the shards (at least one) for validation.
+
+    After compaction the shards are grouped by key hash, so this is a sample of
+    (user, video) pairs rather than the most recent ones. A single shard is all used
+    for training and there is no validation set.
+    """
+    if len(shard_paths) < 2:
+        return shard_paths, []
+    n_val = max(1, len(shard_paths) // 5)
+    return shard_paths[:-n_val], shard_paths[-n_val:]
+
+def _scan_shards(shard_paths):
+    """Stream the id and count columns once to build vocabularies, interactions and user clusters."""
+    builder = InteractionMatrixBuilder()
+    kmeans = MiniBatchKMeans(n_clusters=5, random_state=0)
+    n_records = 0
+    columns = ["user_id", "video_id"] + CLUSTER_FEATURES
+    for batch in make_dataset(shard_paths, columns=columns).as_numpy_iterator():
+        builder.add(
+            [user_id.decode('utf-8') for user_id in batch["user_id"]],
+            [video_id.decode('utf-8') for video_id in batch["video_id"]],
+            batch["views"]
         )
+        features = np.column_stack([batch[name] for name in CLUSTER_FEATURES]).astype(np.float32)
+        if len(features) >= kmeans.n_clusters:
+            kmeans.partial_fit(features)
+        n_records += len(features)
 
-        logger.info("Defined the retrieval model.")
-
-        interaction_matrix = np.zeros((len(user_ids), len(video_ids)))
-        for record in data:
-            user_idx = user_ids.index(record["user_id"])
-            video_idx = video_ids.index(record["video_id"])
-            interaction_matrix[user_idx, video_idx] = record["views"]
+    if hasattr(kmeans, 'cluster_centers_'):
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+    else:
+        centroids = np.zeros((1, len(CLUSTER_FEATURES)), dtype=np.float32)
+    return builder, centroids, n_records
 
-        svd = TruncatedSVD(n_components=50, random_state=42)
-        user_factors = svd.fit_transform(interaction_matrix)
-        video_factors = svd.components_.T
+def _cluster_assigner(centroids):
+    centroids = tf.constant(centroids)
 
-        logger.info("Performed matrix factorization using SVD.")
+    def assign(features):
+        points = tf.stack([tf.cast(features[name], tf.float32) for name in CLUSTER_FEATURES], axis=1)
+        distances = tf.reduce_sum(tf.square(points[:, None, :] - centroids[None, :, :]), axis=-1)
+        features["user_cluster"] = tf.argmin(distances, axis=1)
+        return features
 
-        combined_user_model = tf.keras.layers.Concatenate()([user_model.output, user_factors])
-        combined_video_model = tf.keras.layers.Concatenate()([video_model.output, video_factors])
+    return assign
 
-        hybrid_model = tfrs.models.Model(
-            user_model=tf.keras.Model(user_model.input, combined_user_model),
-            item_model=tf.keras.Model(video_model.input, combined_video_model),
-            task=tfrs.tasks.Retrieval(metrics=tfrs.metrics.FactorizedTopK(candidates=video_ids))
-        )
+def train_model(shard_dir=TRAINING_SHARD_DIR):
+    start_time = time.time()
+    logger.info("Starting model training...")
 
-        logger.info("Defined the hybrid recommendation model.")
+    try:
+        with data_lock:
+            # A full retrain reads the whole history, so dedupe it first.
+            shard_paths = compact_shards(shard_dir)
+            if not shard_paths:
+                logger.warning(f"No training shards found in {shard_dir}. Skipping training.")
+                return None
+
+            builder, centroids, n_records = _scan_shards(shard_paths)
+            interaction_matrix = builder.build()
+
+        user_vocabulary = list(builder.user_index)
+        video_vocabulary = list(builder.video_index)
+        logger.info(f"Scanned {n_records} records in {len(shard_paths)} shards over {len(user_vocabulary)} users and {len(video_vocabulary)} videos.")
+
+        train_paths, val_paths = _split_shards(shard_paths)
+        assign_cluster = _cluster_assigner(centroids)
+        train_dataset = make_dataset(train_paths, shuffle_buffer=4 * BATCH_SIZE).map(assign_cluster, num_parallel_calls=AUTOTUNE)
+        val_dataset = make_dataset(val_paths).map(assign_cluster, num_parallel_calls=AUTOTUNE) if val_paths else None
+
+        if min(interaction_matrix.shape) < 2:
+            # TruncatedSVD needs n_components < n_features; with one user or one video
+            # there is nothing to factorise, so the factors carry no signal.
+            user_factors = np.zeros((interaction_matrix.shape[0], 1), dtype=np.float32)
+            video_factors = np.zeros((interaction_matrix.shape[1], 1), dtype=np.float32)
+            logger.warning(f"Interaction matrix {interaction_matrix.shape} is too small for SVD. Using zero factors.")
+        else:
+            n_components = min(50, min(interaction_matrix.shape) - 1)
+            svd = TruncatedSVD(n_components=n_components, random_state=42)
+            user_factors = svd.fit_transform(interaction_matrix)
+            video_factors = svd.components_.T
+            logger.info("Performed matrix factorization using SVD.")
 
         strategy = tf.distribute.MirroredStrategy()
         with strategy.scope():
+            # The SVD factors are frozen lookups inside each tower, so the trained
+            # towers, the exported tables and the checkpoint all see the same vectors.
+            user_model = build_hybrid_tower(user_vocabulary, with_oov_row(user_factors))
+            video_model = build_hybrid_tower(video_vocabulary, with_oov_row(video_factors))
+            candidates = tf.data.Dataset.from_tensor_slices(video_vocabulary).batch(BATCH_SIZE).map(video_model)
+            hybrid_model = MyModel(
+                user_model, video_model,
+                tfrs.tasks.Retrieval(metrics=tfrs.metrics.FactorizedTopK(candidates=candidates))
+            )
+            logger.info("Defined the hybrid recommendation model.")
+
             hybrid_model.compile(optimizer=tf.keras.optimizers.Adagrad(learning_rate=0.1))
             logger.info("Compiled the hybrid recommendation model.")
 
-            train_size = int(0.8 * len(data))
-            train_dataset = dataset.take(train_size)
-            val_dataset = dataset.skip(train_size)
-
             tf.profiler.experimental.start('logdir')
 
             hybrid_model.fit(train_dataset, validation_data=val_dataset, epochs=3)
@@ -120,12 +128,35 @@ def train_model(data):
 
             tf.profiler.experimental.stop()
 
-            eval_result = hybrid_model.evaluate(val_dataset)
-            logger.info(f"Model evaluation result: {eval_result}")
-
-            tf.saved_model.save(hybrid_model.user_model, os.path.join(MODEL_DIR, 'user_model'))
-            tf.saved_model.save(hybrid_model.item_model, os.path.join(MODEL_DIR, 'video_model'))
-            logger.info(f"Saved user and video models to {MODEL_DIR}.")
+            if val_dataset is not None:
+                eval_result = hybrid_model.evaluate(val_dataset)
+                logger.info(f"Model evaluation result: {eval_result}")
+                # The checkpoint marks every shard as trained and their users are in the
+                # vocabulary, so fit the held-out shards too once they have been scored.
+                hybrid_model.fit(val_dataset, epochs=3)
+                logger.info("Trained on the validation shards.")
+            else:
+                logger.info("Only one training shard; skipped validation.")
+
+            staging_dir = create_staging_dir()
+            tf.saved_model.save(user_model, os.path.join(staging_dir, 'user_model'))
+            tf.saved_model.save(video_model, os.path.join(staging_dir, 'video_model'))
+            export_embeddings(staging_dir, user_model, user_vocabulary, video_model, video_vocabulary)
+            logger.info(f"Saved user and video models to {staging_dir}.")
+
+            # Publish first: a checkpoint must never cover shards that no published version was trained on.
+            publish_version(staging_dir)
+
+            save_checkpoint(
+                user_vocabulary, user_model.get_layer('embedding').get_weights()[0], user_model.get_layer('svd_factors').get_weights()[0],
+                video_vocabulary, video_model.get_layer('embedding').get_weights()[0], video_model.get_layer('svd_factors').get_weights()[0],
+                shard_paths, full_retrain=True
+            )
+            logger.info("Saved warm-start checkpoint.")
+
+        cluster_lists, user_clusters, interest_clusters = build_cluster_lists(shard_paths, centroids)
+        store_cluster_fallbacks(cluster_lists, user_clusters, interest_clusters)
+        save_centroids(centroids)
 
         end_time = time.time()
         logger.info(f"Model training completed in {end_time - start_time:.2f} seconds.")
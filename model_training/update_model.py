@@ -1,9 +1,19 @@
 import threading
+import numpy as np
 import tensorflow as tf
 import tensorflow_recommenders as tfrs
 from typing import Dict, Text
 import os
+import time
+from utils.config import TRAINING_SHARD_DIR, EPOCHS, LEARNING_RATE
 from utils.logger import setup_logger
+from model_training.input_pipeline import make_dataset, list_shards
+from model_training.checkpoint import load_checkpoint, save_checkpoint, load_centroids
+from model_training.clusters import assign_user_clusters
+from model_serving.fallback import store_user_clusters
+from model_training.towers import build_hybrid_tower
+from model_serving.model_registry import create_staging_dir, publish_version
+from model_serving.embedding_store import export_embeddings
 
 logger = setup_logger()
 
@@ -38,35 +48,84 @@ def save_model(model: MyModel, model_dir: str):
     tf.saved_model.save(model.user_model, os.path.join(model_dir, 'user_model'))
     tf.saved_model.save(model.video_model, os.path.join(model_dir, 'video_model'))
 
+def extend_tower(vocabulary: list, embeddings: np.ndarray, factors: np.ndarray, new_ids, seed: int = 0):
+    """Rebuild a hybrid tower whose vocabulary and tables are grown for unseen ids.
+
+    Existing rows keep their trained embeddings and SVD factors. Rows for new ids get
+    embeddings initialised the way Keras initialises a fresh Embedding layer and zero
+    factors, like the OOV row, until the next full retrain factorises them.
+    """
+    known = set(vocabulary)
+    added = [item for item in dict.fromkeys(new_ids) if item not in known]
+    vocabulary = list(vocabulary) + added
+
+    rng = np.random.default_rng(seed)
+    new_rows = rng.uniform(-0.05, 0.05, size=(len(added), embeddings.shape[1])).astype(np.float32)
+    table = np.concatenate([embeddings, new_rows], axis=0)
+    factors = np.concatenate([factors, np.zeros((len(added), factors.shape[1]), dtype=np.float32)], axis=0)
+
+    tower = build_hybrid_tower(vocabulary, factors, embeddings=table)
+    return tower, vocabulary, len(added)
+
+def _scan_ids(shard_paths):
+    user_ids, video_ids = {}, {}
+    for batch in make_dataset(shard_paths, columns=["user_id", "video_id"]).as_numpy_iterator():
+        user_ids.update(dict.fromkeys(user_id.decode('utf-8') for user_id in batch["user_id"]))
+        video_ids.update(dict.fromkeys(video_id.decode('utf-8') for video_id in batch["video_id"]))
+    return list(user_ids), list(video_ids)
 
 data_lock = threading.Lock()
 
-def update_model(data, model_dir: str):
-    """Update the model with new data."""
+def update_model(shard_dir: str = TRAINING_SHARD_DIR):
+    """Warm-start from the last checkpoint and fine-tune on shards written since it was taken.
+
+    Returns the fine-tuned model, or None when there is no checkpoint or nothing new to train on.
+    """
+    start_time = time.time()
     with data_lock:
-        model = load_model(model_dir)
-
-        user_ids = [record["user_id"] for record in data]
-        video_ids = [record["video_id"] for record in data]
-        interests = [record["interests"] for record in data]
-        tags = [record["tags"] for record in data]
-        descriptions = [" ".join(record["description"]) for record in data]
-        retention = [record["retention"] for record in data]
-        views = [record["views"] for record in data]
-        impressions = [record["impressions"] for record in data]
-
-    dataset = tf.data.Dataset.from_tensor_slices({
-        "user_id": user_ids,
-        "video_id": video_ids,
-        "interests": interests,
-        "tags": tags,
-        "description": descriptions,
-        "retention": retention,
-        "views": views,
-        "impressions": impressions
-    }).batch(4096)
-
-    model.compile(optimizer=tf.keras.optimizers.Adagrad(learning_rate=0.1))
-    model.fit(dataset, epochs=3)
-
-    save_model(model, model_dir)
+        checkpoint = load_checkpoint()
+        if checkpoint is None:
+            logger.warning("No training checkpoint found. A full retrain is required.")
+            return None
+
+        trained = set(checkpoint["trained_shards"])
+        new_shards = [path for path in list_shards(shard_dir) if path not in trained]
+        if not new_shards:
+            logger.info("No new training shards since the last checkpoint. Skipping incremental update.")
+            return None
+
+        new_user_ids, new_video_ids = _scan_ids(new_shards)
+        user_model, user_vocabulary, added_users = extend_tower(
+            checkpoint["user_vocabulary"], checkpoint["user_embeddings"], checkpoint["user_factors"], new_user_ids
+        )
+        video_model, video_vocabulary, added_videos = extend_tower(
+            checkpoint["video_vocabulary"], checkpoint["video_embeddings"], checkpoint["video_factors"], new_video_ids
+        )
+        logger.info(f"Extended vocabularies with {added_users} users and {added_videos} videos.")
+
+        model = MyModel(user_model, video_model, tfrs.tasks.Retrieval())
+        model.compile(optimizer=tf.keras.optimizers.Adagrad(learning_rate=LEARNING_RATE))
+        model.fit(make_dataset(new_shards, columns=["user_id", "video_id"]), epochs=EPOCHS)
+
+        staging_dir = create_staging_dir()
+        save_model(model, staging_dir)
+        export_embeddings(staging_dir, user_model, user_vocabulary, video_model, video_vocabulary)
+        # Publish first: a checkpoint must never cover shards that no published version was trained on.
+        publish_version(staging_dir)
+        save_checkpoint(
+            user_vocabulary, user_model.get_layer('embedding').get_weights()[0], user_model.get_layer('svd_factors').get_weights()[0],
+            video_vocabulary, video_model.get_layer('embedding').get_weights()[0], video_model.get_layer('svd_factors').get_weights()[0],
+            checkpoint["trained_shards"] + new_shards
+        )
+
+        # Users first seen in these shards have no cluster yet, so cold-start fallbacks
+        # would only give them the popularity list. Existing users keep the cluster
+        # their full history gave them at the last full retrain.
+        centroids = load_centroids()
+        if centroids is not None and added_users:
+            added = set(user_vocabulary[-added_users:])
+            user_clusters = assign_user_clusters(new_shards, centroids)
+            store_user_clusters({user_id: cluster for user_id, cluster in user_clusters.items() if user_id in added})
+
+    logger.info(f"Incremental update on {len(new_shards)} shards completed in {time.time() - start_time:.2f} seconds.")
+    return model
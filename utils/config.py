@@ -6,15 +6,64 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0
+REDIS_MAX_CONNECTIONS = 20
+REDIS_SOCKET_TIMEOUT = 5
 
 SQLITE_DB_PATH = 'data.db'
+SQLITE_CACHE_SIZE_KB = 64 * 1024
+SQLITE_BULK_CHUNK_SIZE = 10000
+STATS_BUCKET_SECONDS = 3600
+
+INGEST_UPDATED_FIELD = 'updatedAt'
+INGEST_COMMENT_DATE_FIELD = 'date'
+INGEST_COMMENT_WORKERS = 8
 
 MODEL_DIR = os.path.join(os.getcwd(), 'models')  
 EMBEDDING_DIMENSION = 64
 BATCH_SIZE = 4096
 EPOCHS = 3
+
+TRAINING_SHARD_DIR = os.path.join(os.getcwd(), 'training_shards')
+TRAINING_SHARD_SIZE = 50000
+TRAINING_COMPACTION_MAX_PARTITIONS = 256
+TRAINING_CHECKPOINT_DIR = os.path.join(MODEL_DIR, 'checkpoint')
+MODEL_VERSIONS_DIR = os.path.join(MODEL_DIR, 'versions')
+MODEL_VERSIONS_TO_KEEP = 3
+MODEL_STAGING_MAX_AGE = 24 * 3600
+MODEL_POLL_INTERVAL = 30
+FULL_RETRAIN_INTERVAL = 24 * 3600
 LEARNING_RATE = 0.1
 
+NLP_BATCH_SIZE = 256
+NLP_PROCESSES = os.cpu_count() or 1
+FEATURE_CACHE_MAX_ENTRIES = 50000
+COMMENT_CACHE_MAX_ENTRIES = 2000000
+
+TOPIC_MODEL_DIR = os.path.join(os.getcwd(), 'topics')
+TOPIC_COUNT = 20
+TOPIC_VOCAB_SIZE = 2 ** 18
+TOPIC_CHUNK_SIZE = 2000
+
+ANN_NUM_PROBES = 8
+ANN_KMEANS_ITERATIONS = 10
+
+CATALOG_REFRESH_INTERVAL = 30
+CATALOG_FULL_REFRESH_INTERVAL = 3600
+CATALOG_WARM_ANN_INDEX = False
+
+MATERIALIZED_TOP_K = 200
+MATERIALIZED_EXPIRATION = 2 * 24 * 3600
+
+NEW_USER_BATCH_WINDOW = 10
+
+FALLBACK_LIST_SIZE = 500
+
+FIRESTORE_GET_ALL_CHUNK_SIZE = 500
+FIRESTORE_BATCH_SIZE = 500
+FIRESTORE_WRITE_WORKERS = 4
+FIRESTORE_WRITE_RETRIES = 5
+FIRESTORE_RETRY_BACKOFF = 0.5
+
 LOG_FILE_PATH = 'recommendation_system.log'
 LOG_LEVEL = 'INFO'
 
@@ -25,3 +74,9 @@ for hour in range(24):
         SCHEDULE_TIMES.append(f"{hour:02}:{minute:02}")
 
 CACHE_EXPIRATION = 3600  
+CACHE_CODEC = 'msgpack'
+CACHE_COMPRESSION_THRESHOLD = 1024
+CACHE_CHUNK_SIZE = 512 * 1024
+LOCAL_CACHE_MAX_ENTRIES = 1024
+LOCAL_CACHE_TTL = 30
+CACHE_INVALIDATION_CHANNEL = 'cache:invalidate'